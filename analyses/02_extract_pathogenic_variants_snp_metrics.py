@@ -4,6 +4,10 @@ import argparse
 import os
 import sys
 import subprocess
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor
+from pathogenic_variants_profiling import add_profiling_args, count, finish_run, merge_run_stats, new_run_stats, stage, start_run
+from pathogenic_variants_io import METRICS_STORE_SCHEMA, append_metrics, completed_chroms, flush_metrics_store, load_sample_plan, merge_io_stats, new_io_stats, new_metrics_store, normalize_chrom, partition_fingerprint, prune_metrics_store, read_manifest, read_metrics_store, read_pvar, read_sample_metrics, read_sample_metrics_full, read_target_index, report_io_stats, reusable_chroms, select_target_snps, target_chroms, target_fingerprints
 
 # GP2 Pathogenic Variant Analysis
 
@@ -18,6 +22,19 @@ import subprocess
 
 # 17-SEP-2024: Script started
 # 19-NOV-2024: Script cleanup for publication
+# 18-OCT-2026: Added pushdown parquet reader (--reader) and bytes read/kept report
+# 18-OCT-2026: --chr takes several chromosomes (or all) and extracts them in one pass over the sample files
+# 18-OCT-2026: Target variants come from the annotated pathogenic variant index instead of hard-coded positions
+# 18-OCT-2026: Sample quotas are planned up front (--seed) and samples are read in a process pool (--workers)
+# 18-OCT-2026: Metrics are streamed to a parquet store partitioned by ancestry/chromosome (--output csv for the old files)
+# 18-OCT-2026: Parquet runs keep a per-sample manifest and resume from it, skipping samples already extracted
+# 18-OCT-2026: Data paths can be overridden on the command line (used by the benchmarks on synthetic data)
+# 18-OCT-2026: Stage timings, counters and peak memory are recorded (--profile-log, --profile)
+# 18-OCT-2026: The sample plan is built from a compact master key merge and cached next to the output (--sample-plan-cache)
+# 18-OCT-2026: Manifest records partition/target fingerprints, --previous-out copies unchanged samples from the
+#              previous release's store instead of reading them again
+# 18-OCT-2026: Resuming drops store rows of samples that are no longer planned or were re-labelled
+# 18-OCT-2026: Resuming re-extracts chromosomes whose target snps changed since they were extracted
 
 
 def shell_do(command, log=False, return_log=False):
@@ -30,178 +47,209 @@ def shell_do(command, log=False, return_log=False):
     if return_log:
         return(res.stdout.decode('utf-8'))
 
+# read one sample's metrics for the ancestry's snps and label them with the sample and phenotype
+def extract_sample_metrics(sample_path, iid, phenotype, snps, chroms, reader='pushdown', io_stats=None, run_stats=None):
+    with stage(run_stats, 'sample_read', log=False):
+        if reader == 'pushdown':
+            metrics_needed = read_sample_metrics(sample_path, chroms, snp_ids=snps['snpID'], io_stats=io_stats)
+        else:
+            metrics_needed = read_sample_metrics_full(sample_path, chroms, io_stats=io_stats)
+
+    with stage(run_stats, 'sample_merge', log=False):
+        metrics_needed['Sample_ID'] = iid
+        metrics_needed = metrics_needed.merge(snps, how='inner', on=['snpID'])
+        metrics_needed['phenotype'] = phenotype
+
+    return metrics_needed
+
+# pool worker for one planned sample, returns its metrics, partition fingerprint and its own io stats and stage timings
+def extract_planned_sample(sample, snps, reader='pushdown'):
+    sample_io_stats = new_io_stats()
+    sample_run_stats = new_run_stats('extract_sample')
+    fingerprint = partition_fingerprint(sample['sample_path'])
+    metrics_needed = extract_sample_metrics(sample['sample_path'], sample['IID'], sample['gp2_phenotype'], snps, sample['chroms'], reader=reader, io_stats=sample_io_stats, run_stats=sample_run_stats)
+    return metrics_needed, fingerprint, sample_io_stats, sample_run_stats
+
 if __name__ == '__main__':
 
     # argparse for chromosome specification
     parser = argparse.ArgumentParser(description='Metrics Parser')
-    parser.add_argument('--chr', type=int, default=1, help='Chromosome to get metrics for')
+    parser.add_argument('--chr', type=str, nargs='+', default=['1'], help='Chromosome(s) to get metrics for, or "all" for every target chromosome')
+    parser.add_argument('--reader', type=str, default='pushdown', choices=['pushdown', 'full'], help='Parquet reader: pushdown only reads needed columns/row groups, full reads whole sample partitions')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for choosing PD/Control samples in large ancestries (default: first samples in barcode order)')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes reading sample partitions')
+    parser.add_argument('--output', type=str, default='parquet', choices=['parquet', 'csv'], help='Write a parquet store partitioned by ancestry/chromosome or per-ancestry chr{N}_metrics.csv files')
+    parser.add_argument('--batch-rows', type=int, default=1000000, help='Rows buffered before each write to the parquet store')
+    parser.add_argument('--flush-seconds', type=int, default=300, help='Seconds between writes to the parquet store')
+    parser.add_argument('--restart', action='store_true', help='Ignore the manifest of a previous parquet run and re-extract every planned sample')
+    parser.add_argument('--snp-metrics-dir', type=str, default='/path/to/snp/metrics', help='Directory of per-barcode SNP metrics parquet partitions')
+    parser.add_argument('--master-key-full', type=str, default='/path/to/full/master/key', help='Full master key (tab-separated)')
+    parser.add_argument('--master-key-release', type=str, default='/path/to/release6/master/key', help='Release master key (comma-separated)')
+    parser.add_argument('--genotypes', type=str, default='/path/to/release6/plink/genotypes', help='Release plink2 genotype prefix (reads <prefix>.pvar)')
+    parser.add_argument('--pathogenic-snps', type=str, default='/path/to/annotated_pathogenic_vars.txt', help='Annotated pathogenic variants from 00_pathogenic_variants_analyses.ipynb')
+    parser.add_argument('--out', type=str, default='/path/to/output/directory', help='Output directory')
+    parser.add_argument('--previous-out', type=str, default=None, help='Output directory of a previous (release) run; samples whose partitions and target snps are unchanged are copied from its store')
+    parser.add_argument('--sample-plan-cache', type=str, default=None, help='Cached sample plan, rebuilt when the master keys, settings or metrics directories change (default: <out>/sample_plan.parquet)')
+    add_profiling_args(parser)
     args = parser.parse_args()
-    chrom = args.chr
+    reader = args.reader
+    
+    # stage timings, counters and peak memory for this run
+    run_stats = start_run('02_extract_pathogenic_variants_snp_metrics', args)
     
     # data paths
     ## Note: using samples from release 6 since they are processed already
     ## This will not affect results since sample from release 6 are all included in release 7
     wd = '/path/to/working/directory'
-    snp_metrics_data_dir = '/path/to/snp/metrics'
-    master_key_full_path = '/path/to/full/master/key'
-    master_key_release_path = f'/path/to/release6/master/key'
-    genotype_path = '/path/to/release6/plink/genotypes'
-    
-    # read full master key and release master key
-    master_key_full = pd.read_csv(master_key_full_path, sep='\t')
-    master_key_full = master_key_full.rename({'filename':'IID'}, axis=1)
-    master_key_release = pd.read_csv(master_key_release_path)
+    snp_metrics_data_dir = args.snp_metrics_dir
+    master_key_full_path = args.master_key_full
+    master_key_release_path = args.master_key_release
+    genotype_path = args.genotypes
+    pathogenic_snps_path = args.pathogenic_snps
+    metrics_dir = args.out
+    metrics_store_path = f'{metrics_dir}/snp_metrics'
+    manifest_path = f'{metrics_dir}/snp_metrics_manifest.tsv'
+    sample_plan_cache_path = args.sample_plan_cache or f'{metrics_dir}/sample_plan.parquet'
     
-    # merge master keys and subset samples down to those included in the release
-    master_key_merge = master_key_full[['GP2sampleID', 'IID', 'SentrixBarcode_A']].merge(master_key_release[['GP2sampleID', 'gp2_phenotype', 'label','pruned']], how='inner', on=['GP2sampleID'])
-    master_key_merge = master_key_merge[master_key_merge['pruned'] == 0]
+    # check if the metrics output dir exists and create it if not
+    if not os.path.isdir(metrics_dir):
+        os.makedirs(metrics_dir)
     
-    # dictionaries and df for metrics and maf
+    # build the target variant index from the annotated pathogenic variants
+    ## Note: --chr all extracts every chromosome with a target variant
+    with stage(run_stats, 'target_index'):
+        target_index = read_target_index(pathogenic_snps_path)
+        chroms = target_chroms(target_index) if 'all' in args.chr else normalize_chrom(args.chr).tolist()
+    
+    # plan which samples get metrics extracted before reading any of them
+    ## Note: the merged release/full master keys (pruned samples removed) are only read when the cached plan is out of date
+    with stage(run_stats, 'sample_plan'):
+        sample_plan, ancestry_counts = load_sample_plan(master_key_full_path, master_key_release_path, snp_metrics_data_dir, cache_path=sample_plan_cache_path, seed=args.seed, run_stats=run_stats)
+    count(run_stats, 'samples_planned', len(sample_plan))
+    
+    # read the pvar once and look up target variants on every requested chromosome
+    with stage(run_stats, 'pvar_load'):
+        bim = read_pvar(f'{genotype_path}.pvar')
+        ## Note: pvar alleles are kept as a1 (ALT) and a2 (REF) for the allele-aware join in the viewer
+        target_snps = select_target_snps(bim, target_index, chroms)[['#CHROM','snpID','REF','ALT']]
+        target_snps = target_snps.rename({'ALT':'a1','REF':'a2'}, axis=1).drop_duplicates(subset=['snpID'])
+        ## Note: fingerprints of each chromosome's targets are recorded in the manifest for later releases
+        target_hashes = target_fingerprints(target_snps)
+        target_snps = target_snps[['snpID','a2','a1']]
+    count(run_stats, 'target_snps', len(target_snps))
+    
+    # dictionaries for metrics
     metrics_samples = {}
-    full_bim_snps = pd.DataFrame()
     
     # loop through ancestires to initialize nested dictionaries
-    for ancestry in master_key_merge['label'].unique():
+    for ancestry, ancestry_count in ancestry_counts.items():
         
         # only ancestries with >50 samples get metrics extracted
-        if master_key_merge['label'].value_counts()[ancestry] > 50:
-            bim = pd.read_csv(f'{genotype_path}.pvar', sep='\s+')
-            bim = bim.rename({'ID':'snpID','POS':'bp'}, axis=1)
-            
-            # isolate chromosomes one by one according to the list in the hackathon_rv_extract_snp_metrics.ipynb notebook
-            ## Note: positions on each chromosome are copied over from the hackathon_rv_extract_snp_metrics.ipynb notebook as well
-            if chrom == 'M':
-                bim = bim[bim['#CHROM'] == 'MT']
-            elif chrom == 1:
-                bim = bim[bim['#CHROM'] == 1]
-                bim = bim[bim['bp'].isin([155235197, 155235205, 155235819, 155235843, 155236246, 155236420, 155237394, 155237412, 155237446, 155238141, 155238174, 155238214, 155238228, 155238258, 155238290, 155238291, 155238608, 155238631, 155239639, 155240025, 16986091, 16986235, 16986335, 16986490, 16986526, 16986554, 16986571, 16986610, 16986818, 16986847, 16988138, 16988161, 16988338, 16988444, 16988465, 16989977, 16990132, 16990133, 16990208, 16990254, 16990276, 16991787, 16991795, 16992019, 16992301, 16992322, 16992348, 16992378, 16992564, 16993667, 16993668, 16993690, 16996069, 16996255, 16996293, 16996298, 16996448, 16996487, 16996489, 16997087, 16997135, 16997136, 17000057, 17000099, 17000107, 17000307, 17000494, 17004773, 17005465, 17005548, 17005747, 17005753, 17011732, 20633615, 20633713, 20633815, 20633840, 20637868, 20637888, 20637956, 20638012, 20644540, 20644571, 20644649, 20645615, 20645665, 20645675, 20645695, 20648528, 20648534, 20648612, 20649224, 20650643, 20650673, 65392454, 7962868, 7984985])]
-            elif chrom == 2:
-                bim = bim[bim['#CHROM'] == 2]
-                bim = bim[bim['bp'].isin([74530221, 74530396, 74531866, 74532634])]
-            elif chrom == 3:
-                bim = bim[bim['#CHROM'] == 3]
-                bim = bim[bim['bp'].isin([132477995, 132494190])]
-            elif chrom == 4:
-                bim = bim[bim['#CHROM'] == 4]
-                bim = bim[bim['bp'].isin([41261759, 89822254, 89822327, 89822336])]
-            elif chrom == 6:
-                bim = bim[bim['#CHROM'] == 6]
-                bim = bim[bim['bp'].isin([161350125, 161350187, 161350208, 161360169, 161548937, 161569369, 161785829, 161785899, 161973317, 162201134, 162201143, 162262692, 162262763, 162443314, 162443356, 162443371, 162443383, 162443433])]
-            elif chrom == 12:
-                bim = bim[bim['#CHROM'] == 12]
-                bim = bim[bim['bp'].isin([40225233, 40225580, 40235634, 40238078, 40240543, 40243668, 40249843, 40251273, 40251346, 40252958, 40257283, 40259507, 40259578, 40263791, 40263806, 40284011, 40293624, 40308476, 40308481, 40314043, 40320043, 40323256, 40328416, 40335008, 40340400, 40354304, 40356145, 40359345, 40363440, 40363526, 40364956])]
-            elif chrom == 15:
-                bim = bim[bim['#CHROM'] == 15]
-                bim = bim[bim['bp'].isin([61856408, 61922492, 62012126, 62028419, 89316771, 89316804, 89316819, 89317379, 89317389, 89317407, 89317455, 89317460, 89317470, 89317500, 89317531, 89318553, 89318555, 89318573, 89318579, 89318587, 89318611, 89318640, 89318736, 89318737, 89318946, 89318962, 89318982, 89318985, 89318988, 89319006, 89319053, 89319065, 89319234, 89319257, 89319308, 89320850, 89320857, 89320867, 89320869, 89320877, 89320890, 89320894, 89320939, 89320948, 89321007, 89321135, 89321194, 89321217, 89321223, 89321239, 89321246, 89321258, 89321761, 89321770, 89321771, 89321793, 89321846, 89321847, 89322749, 89323405, 89323423, 89323449, 89323460, 89323462, 89323823, 89323851, 89323863, 89324126, 89324137, 89324149, 89324150, 89324156, 89324158, 89324194, 89324200, 89324221, 89325456, 89325470, 89325494, 89325494, 89325501, 89325512, 89325516, 89325519, 89325531, 89325549, 89325557, 89325562, 89325591, 89325609, 89325610, 89325619, 89325638, 89325656, 89325678, 89326695, 89326698, 89326725, 89326947, 89326952, 89327198, 89327211, 89327214, 89327244, 89327289, 89327300, 89327324, 89327325, 89327331, 89327349, 89328508, 89328532, 89328699, 89328789, 89328991, 89328996, 89328996, 89329011, 89329051, 89329055, 89329098, 89329104, 89330106, 89330133, 89330138, 89330257, 89330258, 89333152, 89333233, 89333239, 89333271, 89333327, 89333347, 89333364, 89333425, 89333427, 89333491, 89333491, 89333569, 89333601, 89333624, 89333626, 89333668])]
-            elif chrom == 16:
-                bim = bim[bim['#CHROM'] == 16]
-                bim = bim[bim['bp'].isin([46660543, 46671809, 46674439, 46674616, 46679015])]
-                
-            # for whatever reason some chr 21 and 22 have string values in the release bim file
-            elif chrom == 21:
-                bim = bim[(bim['#CHROM'] == 21) | (bim['#CHROM'] == '21')]
-                bim = bim[bim['bp'].isin([32639767, 32665968, 32666479, 32688306, 32726858])]
-            elif chrom == 22:
-                bim = bim[bim['#CHROM'] == '22']
-                bim = bim[bim['bp'].isin([32479135, 32485115, 32491175, 32498467, 32498496, 32498507, 38112165, 38112212, 38112295, 38112521, 38112541, 38112558, 38112565, 38113560, 38113561, 38115578, 38115582, 38115663, 38116119, 38116155, 38116156, 38116176, 38120776, 38120886, 38120887, 38120888, 38123138, 38123185, 38123191, 38123251, 38126374, 38126390, 38128349, 38129529, 38132850, 38132917, 38132922, 38132942, 38132952, 38133010, 38135034, 38140006, 38143219, 38145447, 38145467, 38145477, 38145538, 38145597, 38145625, 38169218, 38169326])]
-            
-            else:
-                bim = bim[bim['#CHROM'] == chrom]
-        
+        if ancestry_count > 50:
             # setting metrics samples dictionary for each ancestry
             metrics_samples[ancestry] = {
-                'count': master_key_merge['label'].value_counts()[ancestry],
-                'PD': 0,
-                'Control': 0,
-                'snps': bim[['snpID']],
+                'count': ancestry_count,
                 'metrics': []
             }
     
-            # getting full set of SNPs in bim files
-            full_bim_snps = pd.concat([full_bim_snps, metrics_samples[ancestry]['snps']])
-    
-    # drop any duplicate snps between ancestires
-    full_bim_snps = full_bim_snps.drop_duplicates(ignore_index=True)
-    print(full_bim_snps.shape)
-    
-    # loop through barcodes
-    for barcode in master_key_merge['SentrixBarcode_A'].unique():
-        # check if barcode dir exists
-        dir_path = f'{snp_metrics_data_dir}/{barcode}'
-        parquet_path = f'{snp_metrics_data_dir}/{barcode}/snp_metrics_{barcode}'
-        if os.path.isdir(dir_path) and os.path.isdir(parquet_path):
-            # isolate samples from that barcode in master key
-            master_key_merge_barcode = master_key_merge[master_key_merge['SentrixBarcode_A'] == barcode]
+    # running totals of parquet bytes read vs kept
+    io_stats = new_io_stats()
+    
+    # planned PD/Control samples per ancestry
+    planned_counts = sample_plan.groupby(['label','gp2_phenotype'], observed=True).size().unstack('gp2_phenotype', fill_value=0)
+    print(planned_counts.reindex(index=list(metrics_samples.keys()), columns=['PD','Control'], fill_value=0), file=sys.stderr)
+    
+    # chromosomes each planned sample still needs
+    samples = sample_plan.to_dict('records')
+    for sample in samples:
+        sample['chroms'] = chroms
+    
+    # open the store, resuming from the manifest unless asked to restart, and skip samples that are already done
+    ## Note: on resume, samples the current plan no longer has (or has under another ancestry/phenotype) and chromosomes
+    ## whose target snps changed since they were extracted are dropped first
+    if args.output == 'parquet':
+        with stage(run_stats, 'store_open'):
+            metrics_store = new_metrics_store(metrics_store_path, metrics_samples.keys(), chroms, batch_rows=args.batch_rows, flush_seconds=args.flush_seconds, manifest_path=manifest_path, resume=not args.restart, run_stats=run_stats)
+            if not args.restart:
+                n_dropped, rows_dropped = prune_metrics_store(metrics_store, sample_plan, chroms, target_hashes=target_hashes)
+                print(f'Sample chromosomes dropped from the store (no longer planned, re-labelled or target snps changed): {n_dropped} ({rows_dropped} rows)', file=sys.stderr)
+                count(run_stats, 'samples_dropped', n_dropped)
+            done = completed_chroms(metrics_store)
+        for sample in samples:
+            sample['chroms'] = [chrom for chrom in chroms if chrom not in done.get((str(sample['SentrixBarcode_A']), str(sample['IID'])), set())]
+        print(f'Samples already extracted: {sum(len(sample["chroms"]) == 0 for sample in samples)}/{len(samples)}', file=sys.stderr)
+        count(run_stats, 'samples_skipped', sum(len(sample['chroms']) == 0 for sample in samples))
+        samples = [sample for sample in samples if len(sample['chroms']) > 0]
+    
+    # copy samples the previous release extracted from the same partition files with the same targets
+    ## Note: rows are re-labelled with this release's ancestry and phenotype, only new or changed samples are read below
+    if args.previous_out and (args.output == 'parquet'):
+        with stage(run_stats, 'previous_release_copy'):
+            reusable = reusable_chroms(read_manifest(f'{args.previous_out}/snp_metrics_manifest.tsv'), samples, target_hashes)
+            reused_ids = [iid for barcode, iid in reusable]
+            previous_metrics = read_metrics_store(f'{args.previous_out}/snp_metrics', chroms=chroms, sample_ids=reused_ids) if reused_ids else pd.DataFrame(columns=['Sample_ID'])
+            previous_metrics = dict(list(previous_metrics.groupby(previous_metrics['Sample_ID'].astype(str), sort=False)))
             
-            # loop through samples
-            for iid in master_key_merge_barcode['IID']:
-                # ensure sample dir exists
-                sample_path = f'{parquet_path}/Sample_ID={iid}'
-                
-                if os.path.isdir(sample_path):
-                    # isolate specific sample from master key
-                    sample = master_key_merge_barcode[master_key_merge_barcode['IID'] == iid]
-                    
-                    # ensure ancestry needs metrics
-                    if sample['label'].values[0] in metrics_samples.keys():
-                        # if there are less than 200 samples in an ancestry group take all of them
-                        if metrics_samples[sample['label'].values[0]]['count'] < 200:
-                            if (sample['gp2_phenotype'].values[0] == 'PD') | (sample['gp2_phenotype'].values[0] == 'Control'):
-                                metrics_samples[sample['label'].values[0]][sample['gp2_phenotype'].values[0]] += 1
-                                
-                                metrics = pd.read_parquet(sample_path)
-                                metrics = metrics[metrics['chromosome'] == str(chrom)]
-    
-                                metrics_needed = metrics[['snpID','R','Theta','GenTrain_Score','GT','chromosome','position']]
-                                metrics_needed['Sample_ID'] = iid
-    
-                                metrics_needed = metrics_needed.merge(metrics_samples[sample['label'].values[0]]['snps'], how='inner', on=['snpID'])
-                                metrics_needed['phenotype'] = sample['gp2_phenotype'].values[0]
-    
-                                metrics_samples[sample['label'].values[0]]['metrics'].append(metrics_needed)
-    
-                        # otherwise take up to 50 cases and 150 controls
-                        else:
-                            if (metrics_samples[sample['label'].values[0]]['PD'] < 50) & (sample['gp2_phenotype'].values[0] == 'PD'):
-                                metrics_samples[sample['label'].values[0]]['PD'] += 1
-                                
-                                metrics = pd.read_parquet(sample_path)
-                                metrics = metrics[metrics['chromosome'] == str(chrom)]
-    
-                                metrics_needed = metrics[['snpID','R','Theta','GenTrain_Score','GT','chromosome','position']]
-                                metrics_needed['Sample_ID'] = iid
-    
-                                metrics_needed = metrics_needed.merge(metrics_samples[sample['label'].values[0]]['snps'], how='inner', on=['snpID'])
-                                metrics_needed['phenotype'] = 'PD'
-    
-                                metrics_samples[sample['label'].values[0]]['metrics'].append(metrics_needed)
-    
-                            if (metrics_samples[sample['label'].values[0]]['Control'] < 150) & (sample['gp2_phenotype'].values[0] == 'Control'):
-                                metrics_samples[sample['label'].values[0]]['Control'] += 1
-                                
-                                metrics = pd.read_parquet(sample_path)
-                                metrics = metrics[metrics['chromosome'] == str(chrom)]
-    
-                                metrics_needed = metrics[['snpID','R','Theta','GenTrain_Score','GT','chromosome','position']]
-                                metrics_needed['Sample_ID'] = iid
-    
-                                metrics_needed = metrics_needed.merge(metrics_samples[sample['label'].values[0]]['snps'], how='inner', on=['snpID'])
-                                metrics_needed['phenotype'] = 'Control'
-    
-                                metrics_samples[sample['label'].values[0]]['metrics'].append(metrics_needed)
-    
-    # check if the metrics output dir exists and create it if not
-    metrics_dir = f'/path/to/output/directory'
-    if not os.path.isdir(metrics_dir):
-        os.makedirs(metrics_dir)
-    
-    # loop through ancestires and check for/create ancestry-specific dirs
-    for ancestry in metrics_samples:
-        ancestry_dir = f'{metrics_dir}/{ancestry}'
+            for sample in samples:
+                key = (str(sample['SentrixBarcode_A']), str(sample['IID']))
+                if key not in reusable:
+                    continue
+                reuse_chroms, fingerprint = reusable[key]
+                metrics_reused = previous_metrics.get(str(sample['IID']), pd.DataFrame(columns=METRICS_STORE_SCHEMA.names))
+                metrics_reused = metrics_reused[metrics_reused['chromosome'].astype(str).isin(reuse_chroms)].drop(columns=['ancestry']).assign(phenotype=sample['gp2_phenotype'])
+                append_metrics(metrics_store, sample['label'], metrics_reused, barcode=sample['SentrixBarcode_A'], iid=sample['IID'], chroms=reuse_chroms, fingerprint=fingerprint, target_hashes=target_hashes)
+                sample['chroms'] = [chrom for chrom in sample['chroms'] if chrom not in reuse_chroms]
         
-        if not os.path.isdir(ancestry_dir):
-            os.makedirs(ancestry_dir, exist_ok=True)
+        print(f'Samples copied from {args.previous_out}: {len(reusable)}/{len(samples)}', file=sys.stderr)
+        count(run_stats, 'samples_reused', len(reusable))
+        samples = [sample for sample in samples if len(sample['chroms']) > 0]
+    
+    # read planned samples, in parallel if requested
+    ## Note: results come back in plan order so output is identical for any number of workers
+    extract = partial(extract_planned_sample, snps=target_snps, reader=reader)
+    pool = ProcessPoolExecutor(max_workers=args.workers) if args.workers > 1 else None
+    results = pool.map(extract, samples, chunksize=max(1, len(samples) // (args.workers * 4))) if pool else map(extract, samples)
+    
+    ## Note: the extract stage is wall time of the whole loop, sample_read/sample_merge are summed over workers
+    with stage(run_stats, 'extract', samples=len(samples), workers=args.workers):
+        for sample, (metrics_needed, fingerprint, sample_io_stats, sample_run_stats) in zip(samples, results):
+            # stream metrics to the store as they arrive, or keep them for the csv files
+            if args.output == 'parquet':
+                append_metrics(metrics_store, sample['label'], metrics_needed, barcode=sample['SentrixBarcode_A'], iid=sample['IID'], chroms=sample['chroms'], fingerprint=fingerprint, target_hashes=target_hashes)
+            else:
+                metrics_samples[sample['label']]['metrics'].append(metrics_needed)
+            merge_io_stats(io_stats, sample_io_stats)
+            merge_run_stats(run_stats, sample_run_stats)
         
-        # write sample metrics to file
-        metrics_samples_ancestry = pd.concat(metrics_samples[ancestry]['metrics'], axis=0)
-        metrics_samples_ancestry.to_csv(f'{ancestry_dir}/chr{chrom}_metrics.csv', sep=',', index=False)
+        if pool:
+            pool.shutdown()
+    
+    # write whatever is left in the store buffer
+    if args.output == 'parquet':
+        flush_metrics_store(metrics_store)
+        print(f'Rows written to {metrics_store_path}: {metrics_store["rows_written"]}', file=sys.stderr)
+    
+    # otherwise write per-ancestry csv files
+    if args.output == 'csv':
+        with stage(run_stats, 'csv_write'):
+            # loop through ancestires and check for/create ancestry-specific dirs
+            for ancestry in metrics_samples:
+                ancestry_dir = f'{metrics_dir}/{ancestry}'
+            
+                if not os.path.isdir(ancestry_dir):
+                    os.makedirs(ancestry_dir, exist_ok=True)
+            
+                # write sample metrics to one file per chromosome
+                metrics_samples_ancestry = pd.concat(metrics_samples[ancestry]['metrics'], axis=0)
+                for chrom in chroms:
+                    metrics_samples_chrom = metrics_samples_ancestry[metrics_samples_ancestry['chromosome'] == chrom]
+                    metrics_samples_chrom.to_csv(f'{ancestry_dir}/chr{chrom}_metrics.csv', sep=',', index=False)
+    
+    
+    # report parquet bytes read vs kept for this run
+    report_io_stats(io_stats)
+    
+    # stage timings, counters (with the io stats) and peak memory
+    for key in ['samples', 'bytes_on_disk', 'bytes_read', 'rows_kept']:
+        count(run_stats, f'io_{key}', io_stats[key])
+    finish_run(run_stats)
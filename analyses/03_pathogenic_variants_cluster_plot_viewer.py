@@ -1,11 +1,15 @@
 import os
 import sys
+import argparse
 import subprocess
 import datetime
 import numpy as np
 import pandas as pd
 import streamlit as st
-import plotly.express as px
+from pathogenic_variants_io import build_variant_store, open_variant_store, read_metrics_store, read_target_index
+from pathogenic_variants_metrics import collapse_genotype_summary, variant_store_summary
+from pathogenic_variants_plots import cached_plot, new_plot_cache, prefetch_plots
+from pathogenic_variants_profiling import add_profiling_args, count, finish_run, stage, start_run
 
 # GP2 Pathogenic Variant Analysis
 
@@ -15,52 +19,61 @@ import plotly.express as px
 ## Script Overview
 
 # Script to build pathogenic variant cluster plot viewer streamlit app using SNP metrics extracted in
-# 01_extract_pathogenic_variants_snp_metrics.py and save all pathogenic variant plots to PNG
+# 01_extract_pathogenic_variants_snp_metrics.py (PNGs of all pathogenic variant plots are saved by
+# 06_render_pathogenic_variants_cluster_plots.py)
 
 ## CHANGELOG
 
 # 9-OCT-2024: Script started
 # 19-NOV-2024: Script cleanup for publication
+# 18-OCT-2026: Pathogenic variant merge IDs come from the shared target variant index
+# 18-OCT-2026: Reads the parquet metrics store written by 02_extract_pathogenic_variants_snp_metrics.py when present
+# 18-OCT-2026: Browses the per-variant store from 05_build_pathogenic_variants_store.py instead of joining on every rerun
+# 18-OCT-2026: plot_clusters moved to pathogenic_variants_plots.py, PNG export moved to 06_render_pathogenic_variants_cluster_plots.py
+# 18-OCT-2026: Large variants are drawn with WebGL and downsampled to MAX_PLOT_POINTS points (NC/rare genotypes kept)
+# 18-OCT-2026: Stage timings of each rerun can be recorded (streamlit run ... -- --profile-log viewer_profile.jsonl)
+# 18-OCT-2026: Genotype count table comes from the stored per-ancestry/phenotype genotype summary
+# 18-OCT-2026: Variant store and plots are cached once per server process (LRU, PLOT_CACHE_MB cap) instead of per
+#              session, and the plots of neighbouring variants are prefetched in the background
+
+# most points sent to the browser for one cluster plot
+MAX_PLOT_POINTS = 20000
+
+# memory cap of the plot cache shared by all sessions, and variants prefetched on each side of the selection
+PLOT_CACHE_MB = 512
+PREFETCH_NEIGHBOURS = 2
+
+# open the variant store built by 05_build_pathogenic_variants_store.py (memory mapped, one offset per variant)
+## Note: cached per server process, every session shares it; version changes when the files it is read from change,
+## so a rebuilt store is picked up on the next rerun
+## Note: without a built store the metrics are joined to the pathogenic snps here, once per version
+@st.cache_resource(show_spinner='Loading SNP metrics...', max_entries=1)
+def load_variant_store(variant_store_path, snp_metrics_store_path, snp_metrics_path, pathogenic_snps_path, version):
+    if os.path.isdir(variant_store_path):
+        variant_store = open_variant_store(variant_store_path)
+    else:
+        if os.path.isdir(snp_metrics_store_path):
+            snp_metrics = read_metrics_store(snp_metrics_store_path)
+        else:
+            snp_metrics = pd.read_csv(snp_metrics_path, sep='\t')
+        variant_store = build_variant_store(snp_metrics, read_target_index(pathogenic_snps_path))
 
-# cluster plot function
-def plot_clusters(df, x_col='theta', y_col='r', gtype_col='gt', title='snp plot'):
-    d3 = px.colors.qualitative.D3
-
-    cmap = {
-        'AA': d3[0],
-        'AB': d3[1],
-        'BA': d3[1],
-        'BB': d3[2],
-        'NC': d3[3]
-    }
-
-    # custom limits to make plots look good for publication
-    xlim = [0-.2, 1.2]
-    ylim = [0-.1, 2.6]
-
-    lmap = {'r':'R','theta':'Theta'}
-    smap = {'Control':'circle','PD':'diamond-open-dot'}
+    # stores built before the genotype summary was added get it computed once here
+    if variant_store.get('summary') is None:
+        variant_store['summary'] = variant_store_summary(variant_store)
 
-    # plot and update axes for aesthetics
-    fig = px.scatter(df, x=x_col, y=y_col, color=gtype_col, color_discrete_map=cmap, width=650, height=497, labels=lmap, symbol='phenotype', symbol_map=smap)
+    return variant_store
 
-    fig.update_xaxes(range=xlim, nticks=10, zeroline=False)
-    fig.update_yaxes(range=ylim, nticks=10, zeroline=False)
-    
-    fig.update_layout(margin=dict(r=76, t=63, b=75))
 
+# LRU plot cache with prefetch threads, one per server process
+@st.cache_resource
+def load_plot_cache(max_bytes):
+    return new_plot_cache(max_bytes)
 
-    fig.update_layout(legend_title_text='Genotype')
 
-    out_dict = {
-        'fig': fig,
-        'xlim': xlim,
-        'ylim': ylim
-    }
-    
-    fig.update_layout(title_text=f'<b>{title}<b>')
-    
-    return out_dict
+# latest modification time of the files the viewer data is read from
+def data_version(paths):
+    return max([os.stat(path).st_mtime_ns for path in paths if os.path.exists(path)], default=0)
 
 # callback function for cluster plot SNP selector
 def snp_callback():
@@ -68,52 +81,35 @@ def snp_callback():
     st.session_state['snp_choice'] = st.session_state['new_snp_choice']
 
 if __name__ == '__main__':
+    # profiling options are passed after -- on the streamlit command line
+    parser = argparse.ArgumentParser(description='Cluster Plot Browser')
+    add_profiling_args(parser)
+    args = parser.parse_args()
+
+    # stage timings of this rerun
+    run_stats = start_run('03_pathogenic_variants_cluster_plot_viewer', args)
+
     # SNPs and metric path
     snp_metrics_path = f'data/updated_hackathon_snp_metrics.txt'
+    snp_metrics_store_path = f'data/snp_metrics'
     pathogenic_snps_path = f'data/annotated_pathogenic_vars.txt'
+    variant_store_path = f'data/pathogenic_variants_store'
+    snp_metrics_manifest_path = f'data/snp_metrics_manifest.tsv'
 
-    # read metrics into session state to cut down on load time and create merge id
-    if 'snp_metrics' not in st.session_state:
-        snp_metrics = pd.read_csv(snp_metrics_path, sep='\t')
-        snp_metrics['merge_id'] = 'chr' + snp_metrics['chromosome'].astype(str) + ':' + snp_metrics['position'].astype(str) + ':' + snp_metrics['a2'] + ':' + snp_metrics['a1']
-        snp_metrics['merge_id2'] = 'chr' + snp_metrics['chromosome'].astype(str) + ':' + snp_metrics['position'].astype(str) + ':' + snp_metrics['a1'] + ':' + snp_metrics['a2']
-        st.session_state['snp_metrics'] = snp_metrics
-    else:
-        snp_metrics = st.session_state['snp_metrics']
-    
-    st.markdown(snp_metrics.shape)
-
-    # read pathogenic snps and create merge id
-    pathogenic_snps = pd.read_csv(pathogenic_snps_path, sep='\t')
-    # pathogenic_snps[['chr','pos','alt','ref']] = pathogenic_snps['SNP'].str.split(':', expand=True)
-    # pathogenic_snps['merge_id'] =  pathogenic_snps['Chr'].astype(str) + ':' + pathogenic_snps['Start'].astype(str)
-    pathogenic_snps['merge_id'] = pathogenic_snps['Chr'].astype(str) + ':' + pathogenic_snps['Start'].astype(str) + ':' + pathogenic_snps['Ref'] + ':' + pathogenic_snps['Alt']
-    st.markdown(pathogenic_snps.shape)
-    
-
-    # merge metrics with path snps
-    path_metrics1 = snp_metrics.merge(pathogenic_snps, how='inner', on=['merge_id'])
-    path_metrics1 = path_metrics1.drop_duplicates()
-    st.markdown(path_metrics1.shape)
-    st.markdown(len(path_metrics1['merge_id'].unique()))
+    # shared variant store and plot cache
+    version = data_version([f'{variant_store_path}/metrics.arrow', f'{variant_store_path}/index.tsv', f'{variant_store_path}/genotype_summary.parquet', f'{variant_store_path}/genotype_summary.tsv', snp_metrics_manifest_path, snp_metrics_path, pathogenic_snps_path])
+    with stage(run_stats, 'store_open'):
+        variant_store = load_variant_store(variant_store_path, snp_metrics_store_path, snp_metrics_path, pathogenic_snps_path, version)
+    plot_cache = load_plot_cache(PLOT_CACHE_MB * 2**20)
 
-    path_metrics2 = snp_metrics.merge(pathogenic_snps, how='inner', left_on=['merge_id2'], right_on=['merge_id'])
-    path_metrics2 = path_metrics2.drop(columns=['merge_id_x', 'merge_id_y'], axis=1)
-    path_metrics2 = path_metrics2.rename(columns={'merge_id2':'merge_id'})
-    path_metrics2 = path_metrics2.drop_duplicates()
-    st.markdown(path_metrics2.shape)
-    st.markdown(len(path_metrics2['merge_id'].unique()))
+    st.markdown(variant_store['metrics'].shape)
+    st.markdown(len(variant_store['index']))
 
-    path_metrics = pd.concat([path_metrics1, path_metrics2], axis=0)
-    st.markdown(path_metrics.shape)
-    st.markdown(len(path_metrics['merge_id'].unique()))
-
-    
     # set title
     st.title('Cluster Plot Browser')
 
     # get SNP options
-    snp_options = ['Select SNP!']+[snp for snp in path_metrics['merge_id'].unique()]
+    snp_options = ['Select SNP!']+[snp for snp in variant_store['index'].index]
 
     # set default SNP
     if 'snp_choice' not in st.session_state:
@@ -136,19 +132,27 @@ if __name__ == '__main__':
 
     # if a SNP is selected, plot and output a table of the genotype value counts
     if st.session_state['snp_choice'] != 'Select SNP!':
-        snp_df = path_metrics[path_metrics['merge_id'] == st.session_state['snp_choice']]
-        snp_df = snp_df.reset_index(drop=True)
-
-        fig = plot_clusters(snp_df, x_col='Theta', y_col='R', gtype_col='GT', title=st.session_state['snp_choice'])['fig']
-        st.plotly_chart(fig, use_container_width=True)
-
-        st.table(snp_df['GT'].value_counts())
-
-    ## For plotting all SNPs ##
-    for snp in snp_options:
-        if snp != 'Select SNP!':
-            snp_df = path_metrics[path_metrics['merge_id'] == snp]
-            snp_df = snp_df.reset_index(drop=True)
-
-            fig = plot_clusters(snp_df, x_col='Theta', y_col='R', gtype_col='GT', title=snp)['fig']
-            fig.write_image(f"plots/{snp}.png")
+        hits = plot_cache['hits']
+        with stage(run_stats, 'plot_render', variant=st.session_state['snp_choice']):
+            plot = cached_plot(plot_cache, variant_store, st.session_state['snp_choice'], max_points=MAX_PLOT_POINTS, store_key=version)
+            st.plotly_chart(plot['fig'], use_container_width=True)
+        count(run_stats, 'points_plotted', plot['n_plotted'])
+        count(run_stats, 'plot_cache_hits', plot_cache['hits'] - hits)
+        if plot['n_plotted'] < plot['n_points']:
+            st.caption(f'Showing {plot["n_plotted"]} of {plot["n_points"]} samples (NC and rare genotypes shown in full)')
+
+        # genotype counts, B allele frequency and call rate by ancestry and phenotype, plus the variant total
+        summary = variant_store['summary']
+        snp_summary = summary[summary['merge_id'] == st.session_state['snp_choice']]
+        snp_total = collapse_genotype_summary(snp_summary, ['merge_id']).assign(ancestry='all', phenotype='all')
+        snp_summary = pd.concat([snp_summary, snp_total], axis=0, ignore_index=True)
+        st.table(snp_summary[['ancestry','phenotype','n_samples','AA_n','AB_n','BB_n','n_nc','b_freq','call_rate']].set_index(['ancestry','phenotype']))
+
+    # build the plots of the variants around the selection (or the first ones) while the reviewer looks at this one
+    index = snp_options.index(st.session_state['snp_choice']) if st.session_state['snp_choice'] in snp_options else 0
+    neighbours = [snp_options[i] for i in range(index - PREFETCH_NEIGHBOURS, index + PREFETCH_NEIGHBOURS + 1) if (0 < i < len(snp_options)) and (i != index)]
+    prefetch_plots(plot_cache, variant_store, neighbours, max_points=MAX_PLOT_POINTS, store_key=version)
+
+    # only write/print the rerun's totals when asked for, the app reruns on every interaction
+    if args.profile_log or args.profile:
+        finish_run(run_stats)
@@ -1,44 +1,112 @@
+import argparse
 import pandas as pd
+from pathogenic_variants_io import open_variant_store
+from pathogenic_variants_metrics import cluster_metrics, collapse_genotype_summary, variant_store_summary
+from pathogenic_variants_profiling import add_profiling_args, count, finish_run, stage, start_run
 
 # GP2 Pathogenic Variant Analysis
 
 # - **Project:** Parkinson’s Disease Pathogenic Variants: Cross-Ancestry Analysis and Microarray Data Validation
 # - **Version:** Python/3.10.15
-    
+
 ## Script Overview
 
 # Script to calculate metrics from analyset-scored cluster plots generated in 03_pathogenic_variants_cluster_plot_viewer.py
+# - with --automated, cluster metrics and a provisional classification are computed directly from the variant store
+#   built by 05_build_pathogenic_variants_store.py to triage variants before manual review, and call rate, MAF and
+#   NC counts are reported per ancestry from the store's genotype summary
 
 ## CHANGELOG
 
 # 2-NOV-2024: Script started
 # 19-NOV-2024: Script cleanup for publication
+# 18-OCT-2026: Added --automated to compute cluster metrics and a provisional classification from the variant store
+# 18-OCT-2026: Stage timings, counters and peak memory are recorded (--profile-log, --profile)
+# 18-OCT-2026: --automated reports call rate, MAF and NC counts per ancestry from the stored genotype summary
+# 18-OCT-2026: --release picks the release of the manually scored missingness/MAF columns (default r7)
 
 
-if __name__ == '__main__':
-    metrics_path = 'data/cluster_plot_metrics.csv'
-
-    metrics = pd.read_csv(metrics_path, sep=',')
-    print(metrics.head())
-
-    for classification in metrics['Classification'].unique():
-        metrics_class = metrics[metrics['Classification'] == classification]
+# print shape, NC, missingness and MAF summaries for each classification
+def summarize(metrics, class_col='Classification', nc_col='Number of NC', missingness_col='GP2 r7 Missingness Rate', maf_col='GP2 r7 MAF'):
+    for classification in metrics[class_col].unique():
+        metrics_class = metrics[metrics[class_col] == classification]
         print(f'{classification} Shape')
         print(metrics_class.shape)
         print()
 
         print(f'{classification} NC Metrics')
-        print(metrics_class['Number of NC'].mean())
-        print(metrics_class['Number of NC'].min())
-        print(metrics_class['Number of NC'].max())
+        print(metrics_class[nc_col].mean())
+        print(metrics_class[nc_col].min())
+        print(metrics_class[nc_col].max())
         print()
 
         print(f'{classification} Missingness')
-        print(metrics_class['GP2 r7 Missingness Rate'].mean())
+        print(metrics_class[missingness_col].mean())
         print()
 
         print(f'{classification} MAF')
-        print(metrics_class['GP2 r7 MAF'].mean())
+        print(metrics_class[maf_col].mean())
         print()
 
 
+# mean NC count, call rate and MAF of each classification per ancestry, from the genotype summary
+def summarize_ancestries(summary, metrics, class_col='classification'):
+    ancestry_summary = collapse_genotype_summary(summary, ['merge_id','ancestry'])
+    ancestry_summary = ancestry_summary.merge(metrics[['merge_id', class_col]], how='left', on=['merge_id'])
+
+    report = ancestry_summary.groupby([class_col,'ancestry']).agg(
+        variants=('merge_id', 'size'),
+        n_nc=('n_nc', 'mean'),
+        call_rate=('call_rate', 'mean'),
+        maf=('maf', 'mean')
+    )
+    print(report)
+    print()
+
+    return report.reset_index()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cluster Plot Metrics')
+    parser.add_argument('--automated', action='store_true', help='Compute cluster metrics from the variant store instead of reading the manually scored metrics')
+    parser.add_argument('--release', type=str, default='r7', help='GP2 release of the "GP2 <release> Missingness Rate" and "GP2 <release> MAF" columns in the manually scored metrics')
+    add_profiling_args(parser)
+    args = parser.parse_args()
+
+    run_stats = start_run('04_pathogenic_variants_cluster_plot_metrics', args)
+
+    metrics_path = 'data/cluster_plot_metrics.csv'
+    variant_store_path = 'data/pathogenic_variants_store'
+    automated_metrics_path = 'data/automated_cluster_plot_metrics.csv'
+    automated_ancestry_metrics_path = 'data/automated_cluster_plot_metrics_by_ancestry.csv'
+
+    if args.automated:
+        # per-variant centroids/spreads, separation, NC count, call rate and GenTrain in one grouped pass
+        with stage(run_stats, 'store_read'):
+            variant_store = open_variant_store(variant_store_path)
+            path_metrics = variant_store['metrics'].select(['merge_id','GT','Theta','R','GenTrain_Score']).to_pandas()
+        count(run_stats, 'rows', len(path_metrics))
+
+        with stage(run_stats, 'cluster_metrics'):
+            metrics = cluster_metrics(path_metrics)
+        count(run_stats, 'variants', len(metrics))
+
+        with stage(run_stats, 'write'):
+            metrics.to_csv(automated_metrics_path, sep=',', index=False)
+        print(metrics.head())
+
+        summarize(metrics, class_col='classification', nc_col='n_nc', missingness_col='missingness', maf_col='maf')
+
+        # per-ancestry breakdown from the genotype summary written by 05_build_pathogenic_variants_store.py
+        with stage(run_stats, 'ancestry_summary'):
+            summary = variant_store['summary'] if variant_store['summary'] is not None else variant_store_summary(variant_store)
+            ancestry_report = summarize_ancestries(summary, metrics)
+            ancestry_report.to_csv(automated_ancestry_metrics_path, sep=',', index=False)
+
+    else:
+        metrics = pd.read_csv(metrics_path, sep=',')
+        print(metrics.head())
+
+        summarize(metrics, missingness_col=f'GP2 {args.release} Missingness Rate', maf_col=f'GP2 {args.release} MAF')
+
+    finish_run(run_stats)
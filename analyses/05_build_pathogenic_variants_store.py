@@ -0,0 +1,79 @@
+import os
+import sys
+import argparse
+import pandas as pd
+from pathogenic_variants_io import build_variant_store, open_variant_store, read_metrics_store, read_target_index, write_variant_store
+from pathogenic_variants_metrics import variant_store_summary
+from pathogenic_variants_profiling import add_profiling_args, count, finish_run, stage, start_run
+
+# GP2 Pathogenic Variant Analysis
+
+# - **Project:** Parkinson’s Disease Pathogenic Variants: Cross-Ancestry Analysis and Microarray Data Validation
+# - **Version:** Python/3.10.15
+
+## Script Overview
+
+# Script to join extracted SNP metrics to the annotated pathogenic variants once and write the per-variant store
+# browsed by 03_pathogenic_variants_cluster_plot_viewer.py
+# - per-variant, per-ancestry, per-phenotype genotype counts, B allele frequency and call rate are stored with it
+# - each variant's rows are fingerprinted, with --previous-store (the previous release's store) the genotype summary
+#   rows of unchanged variants are copied and only new or changed variants are aggregated again
+## Note: only the genotype summary is incremental, the metrics store is still read, joined, sorted and fingerprinted
+## in full on every build
+
+## CHANGELOG
+
+# 18-OCT-2026: Script started
+# 18-OCT-2026: Stage timings, counters and peak memory are recorded (--profile-log, --profile)
+# 18-OCT-2026: Writes the genotype summary (genotype_summary.tsv) read by the viewer count table and 04 report
+# 18-OCT-2026: Variant fingerprints in index.tsv, --previous-store copies the genotype summary of unchanged variants
+# 18-OCT-2026: Genotype summary is written as genotype_summary.parquet so copied rows match freshly computed ones
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pathogenic Variant Store Builder')
+    parser.add_argument('--snp-metrics', type=str, default='data/snp_metrics', help='Parquet metrics store from 02_extract_pathogenic_variants_snp_metrics.py or merged tab-separated metrics file')
+    parser.add_argument('--pathogenic-snps', type=str, default='data/annotated_pathogenic_vars.txt', help='Annotated pathogenic variants from 00_pathogenic_variants_analyses.ipynb')
+    parser.add_argument('--out', type=str, default='data/pathogenic_variants_store', help='Output variant store directory')
+    parser.add_argument('--previous-store', type=str, default=None, help='Variant store of the previous release, genotype summaries of unchanged variants are copied from it')
+    add_profiling_args(parser)
+    args = parser.parse_args()
+
+    run_stats = start_run('05_build_pathogenic_variants_store', args)
+
+    # read metrics from the parquet store, or the merged file from 01_extract_pathogenic_variants_snp_metrics.ipynb
+    with stage(run_stats, 'metrics_read'):
+        if os.path.isdir(args.snp_metrics):
+            snp_metrics = read_metrics_store(args.snp_metrics)
+        else:
+            snp_metrics = pd.read_csv(args.snp_metrics, sep='\t')
+    print(snp_metrics.shape, file=sys.stderr)
+    count(run_stats, 'rows_read', len(snp_metrics))
+
+    with stage(run_stats, 'target_index'):
+        target_index = read_target_index(args.pathogenic_snps)
+    print(target_index.shape, file=sys.stderr)
+
+    # allele-orientation-aware join, sorted by variant ID with an offset index
+    with stage(run_stats, 'build_store'):
+        variant_store = build_variant_store(snp_metrics, target_index)
+    print(variant_store['metrics'].shape, file=sys.stderr)
+    print(len(variant_store['index']), file=sys.stderr)
+    count(run_stats, 'rows_kept', variant_store['metrics'].num_rows)
+    count(run_stats, 'variants', len(variant_store['index']))
+
+    # genotype counts and frequencies per variant, ancestry and phenotype in one grouped pass
+    with stage(run_stats, 'genotype_summary'):
+        previous_store = open_variant_store(args.previous_store) if args.previous_store else None
+        variant_store['summary'] = variant_store_summary(variant_store, previous_store=previous_store)
+    if (previous_store is not None) and ('fingerprint' in previous_store['index'].columns):
+        unchanged = variant_store['index']['fingerprint'].eq(previous_store['index']['fingerprint'].reindex(variant_store['index'].index)).sum()
+        print(f'Variants unchanged since {args.previous_store}: {unchanged}/{len(variant_store["index"])}', file=sys.stderr)
+        count(run_stats, 'variants_unchanged', unchanged)
+    print(variant_store['summary'].shape, file=sys.stderr)
+    count(run_stats, 'summary_rows', len(variant_store['summary']))
+
+    with stage(run_stats, 'store_write'):
+        write_variant_store(variant_store, args.out)
+
+    finish_run(run_stats)
@@ -0,0 +1,79 @@
+import os
+import sys
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathogenic_variants_io import open_variant_store, read_variant
+from pathogenic_variants_plots import plot_hash, read_render_cache, render_variant, start_renderer, write_render_cache
+from pathogenic_variants_profiling import add_profiling_args, count, finish_run, merge_run_stats, stage, start_run
+
+# GP2 Pathogenic Variant Analysis
+
+# - **Project:** Parkinson’s Disease Pathogenic Variants: Cross-Ancestry Analysis and Microarray Data Validation
+# - **Version:** Python/3.10.15
+
+## Script Overview
+
+# Script to save PNG cluster plots for all pathogenic variants in the store built by 05_build_pathogenic_variants_store.py
+# using the plot_clusters styling from 03_pathogenic_variants_cluster_plot_viewer.py
+# - only variants whose plotted rows (or plot code) changed since the last run are rendered again, found from the
+#   store's variant fingerprints without reading the variants
+# - rendering is spread over a process pool with one kaleido/chrome instance per worker
+
+## CHANGELOG
+
+# 18-OCT-2026: Script started, replaces the "For plotting all SNPs" loop in 03_pathogenic_variants_cluster_plot_viewer.py
+# 18-OCT-2026: Stage timings, counters and peak memory are recorded (--profile-log, --profile)
+# 18-OCT-2026: Plots are hashed from the variant fingerprints in the store index instead of reading every variant
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cluster Plot Renderer')
+    parser.add_argument('--variant-store', type=str, default='data/pathogenic_variants_store', help='Variant store from 05_build_pathogenic_variants_store.py')
+    parser.add_argument('--plots-dir', type=str, default='plots', help='Output directory for PNG files')
+    parser.add_argument('--render-cache', type=str, default='data/cluster_plot_render_cache.tsv', help='Content hashes of the plots rendered by previous runs')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Number of rendering processes')
+    parser.add_argument('--force', action='store_true', help='Render every variant even if its plot is unchanged')
+    add_profiling_args(parser)
+    args = parser.parse_args()
+
+    run_stats = start_run('06_render_pathogenic_variants_cluster_plots', args)
+
+    os.makedirs(args.plots_dir, exist_ok=True)
+
+    # hash every variant's plot and keep the ones whose PNG is missing or out of date
+    ## Note: variants are hashed from the fingerprints in the store index without reading their rows, stores built
+    ## before fingerprints were recorded are hashed from their plotted rows
+    with stage(run_stats, 'plot_hash'):
+        variant_store = open_variant_store(args.variant_store)
+        render_cache = read_render_cache(args.render_cache)
+
+        if 'fingerprint' in variant_store['index'].columns:
+            plot_hashes = {merge_id: plot_hash(None, merge_id, fingerprint=fingerprint) for merge_id, fingerprint in variant_store['index']['fingerprint'].items()}
+        else:
+            plot_hashes = {merge_id: plot_hash(read_variant(variant_store, merge_id), merge_id) for merge_id in variant_store['index'].index}
+        to_render = [merge_id for merge_id, content_hash in plot_hashes.items() if args.force or (render_cache.get(merge_id) != content_hash) or not os.path.isfile(f'{args.plots_dir}/{merge_id}.png')]
+    print(f'Variants to render: {len(to_render)}/{len(plot_hashes)}', file=sys.stderr)
+    count(run_stats, 'variants', len(plot_hashes))
+    count(run_stats, 'variants_skipped', len(plot_hashes) - len(to_render))
+
+    # drop cache entries of variants no longer in the store
+    render_cache = {merge_id: content_hash for merge_id, content_hash in render_cache.items() if merge_id in plot_hashes}
+
+    # render in parallel, recording each plot in the cache as soon as it is written
+    if len(to_render) > 0:
+        workers = max(1, min(args.workers, len(to_render)))
+        ## Note: the render stage is wall time, plot_build/plot_write are summed over workers
+        with stage(run_stats, 'render', variants=len(to_render), workers=workers), ProcessPoolExecutor(max_workers=workers, initializer=start_renderer, initargs=(args.variant_store, args.plots_dir)) as pool:
+            futures = [pool.submit(render_variant, merge_id) for merge_id in to_render]
+            try:
+                for future in as_completed(futures):
+                    merge_id, variant_run_stats = future.result()
+                    render_cache[merge_id] = plot_hashes[merge_id]
+                    merge_run_stats(run_stats, variant_run_stats)
+                    count(run_stats, 'variants_rendered')
+            finally:
+                write_render_cache(render_cache, args.render_cache)
+    else:
+        write_render_cache(render_cache, args.render_cache)
+
+    finish_run(run_stats)
@@ -0,0 +1,92 @@
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from pathogenic_variants_io import open_variant_store
+from pathogenic_variants_metrics import collapse_genotype_summary, variant_store_summary
+from pathogenic_variants_profiling import add_profiling_args, count, finish_run, stage, start_run
+
+# GP2 Pathogenic Variant Analysis
+
+# - **Project:** Parkinson’s Disease Pathogenic Variants: Cross-Ancestry Analysis and Microarray Data Validation
+# - **Version:** Python/3.10.15
+
+## Script Overview
+
+# Script to compare the variant stores of two GP2 releases built by 05_build_pathogenic_variants_store.py
+# - call rate, NC count and allele frequency changes per variant and ancestry come from the stored genotype summaries
+# - variants whose rows are unchanged (same fingerprint) are reported as unchanged without being compared further
+
+## CHANGELOG
+
+# 18-OCT-2026: Script started
+
+
+# genotype summary metrics compared between releases
+DIFF_COLUMNS = ['n_samples', 'n_nc', 'call_rate', 'b_freq', 'maf']
+
+
+# per-variant, per-ancestry changes between two genotype summaries
+## Note: status is new/removed for variant-ancestries only in one release, changed when any compared value moved by
+## more than tolerance, unchanged otherwise
+def diff_summaries(old_summary, new_summary, old_index, new_index, tolerance=1e-9):
+    old = collapse_genotype_summary(old_summary, ['merge_id','ancestry'])[['merge_id','ancestry'] + DIFF_COLUMNS]
+    new = collapse_genotype_summary(new_summary, ['merge_id','ancestry'])[['merge_id','ancestry'] + DIFF_COLUMNS]
+    diff = old.merge(new, how='outer', on=['merge_id','ancestry'], suffixes=('_old','_new'), indicator=True)
+
+    # variants whose store rows are identical in both releases
+    old_fingerprints = old_index['fingerprint'] if 'fingerprint' in old_index.columns else pd.Series(dtype=str)
+    new_fingerprints = new_index['fingerprint'] if 'fingerprint' in new_index.columns else pd.Series(dtype=str)
+    diff['rows_changed'] = (diff['merge_id'].map(old_fingerprints) != diff['merge_id'].map(new_fingerprints)).values
+
+    changed = np.zeros(len(diff), dtype=bool)
+    for col in DIFF_COLUMNS:
+        diff[f'{col}_delta'] = diff[f'{col}_new'] - diff[f'{col}_old']
+        moved = diff[f'{col}_delta'].abs() > tolerance
+        # a frequency appearing or disappearing (no called samples in one release) also counts as a change
+        moved = moved | (diff[f'{col}_old'].isna() != diff[f'{col}_new'].isna())
+        changed = changed | moved.values
+
+    diff['status'] = np.select(
+        [diff['_merge'] == 'right_only', diff['_merge'] == 'left_only', changed],
+        ['new', 'removed', 'changed'],
+        default='unchanged'
+    )
+
+    return diff.drop(columns=['_merge']).sort_values(['merge_id','ancestry']).reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pathogenic Variant Release Diff')
+    parser.add_argument('--old-store', type=str, required=True, help='Variant store of the previous release')
+    parser.add_argument('--new-store', type=str, required=True, help='Variant store of the new release')
+    parser.add_argument('--out', type=str, default='data/pathogenic_variants_release_diff.csv', help='Diff report (variant-ancestries that are new, removed or changed)')
+    parser.add_argument('--all', action='store_true', help='Also write unchanged variant-ancestries')
+    add_profiling_args(parser)
+    args = parser.parse_args()
+
+    run_stats = start_run('07_diff_pathogenic_variants_releases', args)
+
+    # genotype summaries of both releases, computed here for stores built before summaries were stored
+    with stage(run_stats, 'store_read'):
+        old_store = open_variant_store(args.old_store)
+        new_store = open_variant_store(args.new_store)
+        old_summary = old_store['summary'] if old_store['summary'] is not None else variant_store_summary(old_store)
+        new_summary = new_store['summary'] if new_store['summary'] is not None else variant_store_summary(new_store)
+
+    with stage(run_stats, 'diff'):
+        diff = diff_summaries(old_summary, new_summary, old_store['index'], new_store['index'])
+
+    # status counts overall and per ancestry
+    print(diff['status'].value_counts())
+    print()
+    print(diff.groupby(['ancestry','status']).size().unstack('status', fill_value=0))
+    print()
+    for status in ['new', 'removed', 'changed', 'unchanged']:
+        count(run_stats, f'variant_ancestries_{status}', (diff['status'] == status).sum())
+
+    report = diff if args.all else diff[diff['status'] != 'unchanged']
+    report.to_csv(args.out, sep=',', index=False)
+    print(f'Variant-ancestries written to {args.out}: {len(report)}/{len(diff)}', file=sys.stderr)
+
+    finish_run(run_stats)
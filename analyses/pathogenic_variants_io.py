@@ -0,0 +1,711 @@
+import os
+import sys
+import json
+import fcntl
+import shutil
+import hashlib
+import inspect
+import time
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from contextlib import contextmanager
+from pathogenic_variants_profiling import count, stage
+
+# GP2 Pathogenic Variant Analysis
+
+# - **Project:** Parkinson’s Disease Pathogenic Variants: Cross-Ancestry Analysis and Microarray Data Validation
+# - **Version:** Python/3.10.15
+
+## Script Overview
+
+# Shared I/O helpers for reading GP2 SNP metrics, planning which samples to extract, writing the extracted metrics
+# store, the target pathogenic variant index, and the per-variant store used by
+# 02_extract_pathogenic_variants_snp_metrics.py, 03_pathogenic_variants_cluster_plot_viewer.py and
+# 05_build_pathogenic_variants_store.py
+
+## CHANGELOG
+
+# 18-OCT-2026: Script started
+
+
+# columns kept from the per-sample SNP metrics parquet partitions
+METRICS_COLUMNS = ['snpID', 'R', 'Theta', 'GenTrain_Score', 'GT', 'chromosome', 'position']
+
+
+# schema of the extracted metrics store, partitioned by ancestry and chromosome
+## Note: repeated strings are dictionary encoded and R/Theta are stored as float32
+METRICS_STORE_SCHEMA = pa.schema([
+    ('snpID', pa.dictionary(pa.int32(), pa.string())),
+    ('R', pa.float32()),
+    ('Theta', pa.float32()),
+    ('GenTrain_Score', pa.float64()),
+    ('GT', pa.dictionary(pa.int8(), pa.string())),
+    ('position', pa.int64()),
+    ('Sample_ID', pa.dictionary(pa.int32(), pa.string())),
+    ('a1', pa.dictionary(pa.int32(), pa.string())),
+    ('a2', pa.dictionary(pa.int32(), pa.string())),
+    ('phenotype', pa.dictionary(pa.int8(), pa.string())),
+    ('ancestry', pa.string()),
+    ('chromosome', pa.string())
+])
+METRICS_STORE_PARTITIONING = ds.partitioning(pa.schema([('ancestry', pa.string()), ('chromosome', pa.string())]), flavor='hive')
+
+
+# key columns of the target variant index
+TARGET_KEY = ['chrom', 'pos', 'ref', 'alt']
+
+
+# normalize chromosome labels to plain strings ('chr1', 1, '1' -> '1'; 'MT', 'chrM' -> 'M')
+## Note: some chr 21 and 22 rows of the release pvar are read as strings and others as ints
+def normalize_chrom(chrom):
+    chrom = pd.Series(chrom).astype(str).str.replace('^chr', '', regex=True)
+    return chrom.replace({'MT':'M'})
+
+
+# build variant IDs in the chr:pos:ref:alt format used by the annotated pathogenic variant table
+def variant_id(chrom, pos, ref, alt):
+    return 'chr' + normalize_chrom(chrom).values + ':' + pd.Series(pos).astype(str).values + ':' + pd.Series(ref).astype(str).values + ':' + pd.Series(alt).astype(str).values
+
+
+# build the target variant index from the annotated pathogenic variant table (00_pathogenic_variants_analyses.ipynb)
+## Note: one row per (chrom, pos, ref, alt), sorted by position and hashed on the key for lookups
+def build_target_index(pathogenic_snps):
+    pathogenic_snps = pathogenic_snps.copy()
+    if 'Chr' not in pathogenic_snps.columns:
+        pathogenic_snps[['Chr','Start','Ref','Alt']] = pathogenic_snps['SNP'].str.split(':', expand=True)
+
+    pathogenic_snps['chrom'] = normalize_chrom(pathogenic_snps['Chr']).values
+    pathogenic_snps['pos'] = pathogenic_snps['Start'].astype('int64')
+    pathogenic_snps['ref'] = pathogenic_snps['Ref'].astype(str)
+    pathogenic_snps['alt'] = pathogenic_snps['Alt'].astype(str)
+    pathogenic_snps['merge_id'] = variant_id(pathogenic_snps['chrom'], pathogenic_snps['pos'], pathogenic_snps['ref'], pathogenic_snps['alt'])
+
+    target_index = pathogenic_snps.drop_duplicates(subset=TARGET_KEY)
+    target_index = target_index.sort_values(['chrom','pos','ref','alt']).reset_index(drop=True)
+    target_index.index = pd.MultiIndex.from_frame(target_index[TARGET_KEY])
+
+    return target_index
+
+
+def read_target_index(pathogenic_snps_path):
+    return build_target_index(pd.read_csv(pathogenic_snps_path, sep='\t'))
+
+
+# chromosomes with at least one target variant, in numeric order
+def target_chroms(target_index):
+    chroms = target_index['chrom'].unique().tolist()
+    return sorted(chroms, key=lambda chrom: (0, int(chrom)) if chrom.isdigit() else (1, chrom))
+
+
+# flag variants that hit the target index in either allele orientation
+def match_target_variants(chrom, pos, ref, alt, target_index):
+    chrom = normalize_chrom(chrom).values
+    pos = pd.Series(pos).astype('int64').values
+    ref = pd.Series(ref).astype(str).values
+    alt = pd.Series(alt).astype(str).values
+
+    # cheap position prefilter before the allele-aware key lookup
+    hits = pd.Series(pos).isin(target_index['pos'].unique()).to_numpy(copy=True)
+    if hits.any():
+        keys = pd.MultiIndex.from_arrays([chrom[hits], pos[hits], ref[hits], alt[hits]])
+        flipped = pd.MultiIndex.from_arrays([chrom[hits], pos[hits], alt[hits], ref[hits]])
+        hits[hits] = keys.isin(target_index.index) | flipped.isin(target_index.index)
+
+    return hits
+
+
+# read the release pvar with a consistent chromosome type
+def read_pvar(pvar_path):
+    bim = pd.read_csv(pvar_path, sep='\s+', usecols=['#CHROM','POS','ID','REF','ALT'], dtype={'#CHROM':str})
+    bim = bim.rename({'ID':'snpID','POS':'bp'}, axis=1)
+    bim['#CHROM'] = normalize_chrom(bim['#CHROM']).values
+    return bim
+
+
+# isolate the pvar variants in the target index on the given chromosomes
+def select_target_snps(bim, target_index, chroms=None):
+    if chroms is not None:
+        bim = bim[bim['#CHROM'].isin([str(chrom) for chrom in chroms])]
+    return bim[match_target_variants(bim['#CHROM'], bim['bp'], bim['REF'], bim['ALT'], target_index)]
+
+
+# path to one sample's partition in the SNP metrics directory
+def sample_metrics_path(snp_metrics_data_dir, barcode, iid):
+    return f'{snp_metrics_data_dir}/{barcode}/snp_metrics_{barcode}/Sample_ID={iid}'
+
+
+# merged master keys with only the columns the sample plan needs, pruned samples removed
+## Note: IDs are read as strings and ancestry/phenotype as categoricals so the merged key stays small for the full cohort
+def read_master_keys(master_key_full_path, master_key_release_path):
+    master_key_full = pd.read_csv(master_key_full_path, sep='\t', usecols=['GP2sampleID','filename','SentrixBarcode_A'], dtype=str)
+    master_key_full = master_key_full.rename({'filename':'IID'}, axis=1)
+    master_key_release = pd.read_csv(master_key_release_path, usecols=['GP2sampleID','gp2_phenotype','label','pruned'], dtype={'GP2sampleID':str, 'gp2_phenotype':'category', 'label':'category'})
+
+    master_key_merge = master_key_full.merge(master_key_release, how='inner', on=['GP2sampleID'])
+    master_key_merge = master_key_merge[master_key_merge['pruned'] == 0]
+
+    return master_key_merge.drop(columns=['pruned']).reset_index(drop=True)
+
+
+# (barcode, IID) of every sample partition in the SNP metrics directory, listing each barcode directory once
+def list_sample_partitions(snp_metrics_data_dir, barcodes):
+    partitions = set()
+    for barcode in barcodes:
+        barcode_dir = f'{snp_metrics_data_dir}/{barcode}/snp_metrics_{barcode}'
+        if not os.path.isdir(barcode_dir):
+            continue
+        with os.scandir(barcode_dir) as entries:
+            for entry in entries:
+                if entry.name.startswith('Sample_ID=') and entry.is_dir():
+                    partitions.add((str(barcode), entry.name[len('Sample_ID='):]))
+    return partitions
+
+
+# decide up front which samples get metrics extracted
+## Note: ancestries with >min_samples samples are extracted, all PD/Control samples are taken if the ancestry has
+## <full_cohort_max samples, otherwise up to max_cases PD and max_controls Control samples
+## Note: with seed=None the quotas are filled in barcode order (original behaviour), otherwise from a seeded shuffle;
+## the plan is always returned in barcode order so outputs are identical for a given seed
+## Note: every step is a vectorized pass over the merged key, partitions on disk come from one listing per barcode
+def build_sample_plan(master_key_merge, snp_metrics_data_dir, seed=None, min_samples=50, full_cohort_max=200, max_cases=50, max_controls=150):
+    counts = master_key_merge['label'].value_counts()
+
+    # samples in barcode order, then master key order within each barcode
+    plan = master_key_merge[['IID','SentrixBarcode_A','label','gp2_phenotype']].copy()
+    plan = plan.iloc[np.argsort(pd.factorize(plan['SentrixBarcode_A'])[0], kind='stable')]
+    plan['plan_order'] = np.arange(len(plan))
+
+    plan = plan[plan['label'].map(counts).astype(int).values > min_samples]
+    plan = plan[plan['gp2_phenotype'].isin(['PD','Control'])]
+
+    # only samples with a metrics partition on disk count towards quotas
+    partitions = list_sample_partitions(snp_metrics_data_dir, plan['SentrixBarcode_A'].unique())
+    on_disk = pd.MultiIndex.from_arrays([plan['SentrixBarcode_A'].astype(str), plan['IID'].astype(str)]).isin(list(partitions))
+    plan = plan[on_disk]
+
+    if seed is not None:
+        plan = plan.sample(frac=1, random_state=seed)
+
+    quota = np.where(plan['gp2_phenotype'] == 'PD', max_cases, max_controls)
+    rank = plan.groupby(['label','gp2_phenotype'], observed=True).cumcount().values
+    large = plan['label'].map(counts).astype(int).values >= full_cohort_max
+    plan = plan[~large | (rank < quota)]
+
+    plan = plan.sort_values('plan_order').drop(columns=['plan_order']).reset_index(drop=True)
+    plan['sample_path'] = [sample_metrics_path(snp_metrics_data_dir, barcode, iid) for barcode, iid in zip(plan['SentrixBarcode_A'], plan['IID'])]
+
+    return plan
+
+
+# fingerprint of everything a sample plan depends on: the master key files, the plan settings and code, and the
+# barcode directories
+## Note: a barcode directory's mtime changes when sample partitions are added to or removed from it
+def sample_plan_fingerprint(master_key_paths, snp_metrics_data_dir, **settings):
+    fingerprint = hashlib.sha1()
+    fingerprint.update(inspect.getsource(read_master_keys).encode())
+    fingerprint.update(inspect.getsource(build_sample_plan).encode())
+    for path in master_key_paths:
+        stat = os.stat(path)
+        fingerprint.update(f'{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    fingerprint.update(json.dumps(settings, sort_keys=True).encode())
+
+    fingerprint.update(os.path.abspath(snp_metrics_data_dir).encode())
+    if os.path.isdir(snp_metrics_data_dir):
+        with os.scandir(snp_metrics_data_dir) as entries:
+            barcodes = sorted(entry.name for entry in entries if entry.is_dir())
+        for barcode in barcodes:
+            try:
+                fingerprint.update(f'{barcode}:{os.stat(f"{snp_metrics_data_dir}/{barcode}/snp_metrics_{barcode}").st_mtime_ns}'.encode())
+            except FileNotFoundError:
+                continue
+
+    return fingerprint.hexdigest()
+
+
+# sample plan and master key ancestry counts, from the cached plan when nothing it depends on has changed
+## Note: the cache is a small parquet file (IID plus categorical barcode/ancestry/phenotype) with the fingerprint and
+## ancestry counts in its metadata; sample paths are rebuilt on load
+def load_sample_plan(master_key_full_path, master_key_release_path, snp_metrics_data_dir, cache_path=None, seed=None, run_stats=None, **quotas):
+    settings = dict(seed=seed, **quotas)
+    fingerprint = sample_plan_fingerprint([master_key_full_path, master_key_release_path], snp_metrics_data_dir, **settings)
+
+    if cache_path and os.path.isfile(cache_path):
+        cached = pq.read_table(cache_path)
+        metadata = cached.schema.metadata or {}
+        if metadata.get(b'sample_plan_fingerprint', b'').decode() == fingerprint:
+            plan = cached.to_pandas()
+            plan['sample_path'] = [sample_metrics_path(snp_metrics_data_dir, barcode, iid) for barcode, iid in zip(plan['SentrixBarcode_A'], plan['IID'])]
+            ancestry_counts = pd.Series(json.loads(metadata[b'ancestry_counts'].decode()), dtype=int)
+            count(run_stats, 'sample_plan_cache_hit')
+            return plan, ancestry_counts
+
+    with stage(run_stats, 'master_key_merge'):
+        master_key_merge = read_master_keys(master_key_full_path, master_key_release_path)
+    with stage(run_stats, 'sample_plan_build'):
+        plan = build_sample_plan(master_key_merge, snp_metrics_data_dir, seed=seed, **quotas)
+    ancestry_counts = master_key_merge['label'].value_counts().reindex(master_key_merge['label'].unique()).astype(int)
+
+    if cache_path:
+        table = pa.Table.from_pandas(plan.drop(columns=['sample_path']), preserve_index=False)
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            b'sample_plan_fingerprint': fingerprint.encode(),
+            b'ancestry_counts': json.dumps({str(label): int(n) for label, n in ancestry_counts.items()}).encode()
+        })
+        # write next to the cache and rename so a killed job never leaves a half-written plan
+        ## Note: the temporary name is unique per job, per-chromosome swarm jobs sharing an output directory all miss
+        ## the cache at once and write it together
+        tmp_path = f'{cache_path}.{os.getpid()}.{uuid.uuid4().hex}.tmp'
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, cache_path)
+
+    return plan, ancestry_counts
+
+
+# running totals of parquet bytes read vs bytes kept for one extraction run
+def new_io_stats():
+    return {
+        'samples': 0,
+        'bytes_on_disk': 0,
+        'bytes_read': 0,
+        'bytes_kept': 0,
+        'row_groups_total': 0,
+        'row_groups_read': 0,
+        'rows_kept': 0
+    }
+
+
+def merge_io_stats(io_stats, other):
+    for key in io_stats:
+        io_stats[key] += other[key]
+
+
+def report_io_stats(io_stats, file=sys.stderr):
+    read_pct = 100 * io_stats['bytes_read'] / io_stats['bytes_on_disk'] if io_stats['bytes_on_disk'] else 0
+    kept_pct = 100 * io_stats['bytes_kept'] / io_stats['bytes_read'] if io_stats['bytes_read'] else 0
+    print(f'Samples read: {io_stats["samples"]}', file=file)
+    print(f'Row groups read: {io_stats["row_groups_read"]}/{io_stats["row_groups_total"]}', file=file)
+    print(f'Bytes on disk: {io_stats["bytes_on_disk"]}', file=file)
+    print(f'Bytes read: {io_stats["bytes_read"]} ({read_pct:.2f}% of on disk)', file=file)
+    print(f'Bytes kept: {io_stats["bytes_kept"]} ({kept_pct:.2f}% of read)', file=file)
+    print(f'Rows kept: {io_stats["rows_kept"]}', file=file)
+
+
+# compressed size of the given columns in the row groups of a parquet fragment
+def _fragment_bytes(fragment, columns=None):
+    metadata = fragment.metadata
+    n_bytes = 0
+    for row_group in fragment.row_groups:
+        row_group_meta = metadata.row_group(row_group.id)
+        for i in range(row_group_meta.num_columns):
+            column = row_group_meta.column(i)
+            if (columns is None) or (column.path_in_schema in columns):
+                n_bytes += column.total_compressed_size
+    return n_bytes
+
+
+# read one Sample_ID=<iid> partition with column projection and chromosome/snpID filters pushed down to the row groups
+def read_sample_metrics(sample_path, chroms, snp_ids=None, columns=METRICS_COLUMNS, io_stats=None):
+    dataset = ds.dataset(sample_path, format='parquet', partitioning='hive')
+
+    row_filter = ds.field('chromosome').isin([str(chrom) for chrom in chroms])
+    if snp_ids is not None:
+        row_filter = row_filter & ds.field('snpID').isin(pa.array(pd.unique(pd.Series(snp_ids)), type=pa.string()))
+
+    # split files into row groups and drop the ones whose statistics rule out the filter
+    all_row_groups = [row_group for fragment in dataset.get_fragments() for row_group in fragment.split_by_row_group()]
+    row_groups = [row_group for fragment in dataset.get_fragments(filter=row_filter) for row_group in fragment.split_by_row_group(row_filter)]
+
+    metrics = ds.FileSystemDataset(row_groups, dataset.schema, dataset.format, dataset.filesystem).to_table(columns=columns, filter=row_filter)
+
+    if io_stats is not None:
+        io_stats['samples'] += 1
+        io_stats['bytes_on_disk'] += sum(_fragment_bytes(row_group) for row_group in all_row_groups)
+        io_stats['bytes_read'] += sum(_fragment_bytes(row_group, columns) for row_group in row_groups)
+        io_stats['bytes_kept'] += metrics.nbytes
+        io_stats['row_groups_total'] += len(all_row_groups)
+        io_stats['row_groups_read'] += len(row_groups)
+        io_stats['rows_kept'] += metrics.num_rows
+
+    return metrics.to_pandas()
+
+
+# read a full Sample_ID=<iid> partition and filter in memory (original behaviour, kept for comparison)
+def read_sample_metrics_full(sample_path, chroms, columns=METRICS_COLUMNS, io_stats=None):
+    metrics = pd.read_parquet(sample_path)
+    metrics = metrics[metrics['chromosome'].isin([str(chrom) for chrom in chroms])]
+    metrics = metrics[columns].copy()
+
+    if io_stats is not None:
+        dataset = ds.dataset(sample_path, format='parquet', partitioning='hive')
+        on_disk = sum(_fragment_bytes(fragment) for fragment in dataset.get_fragments())
+        n_row_groups = sum(fragment.metadata.num_row_groups for fragment in dataset.get_fragments())
+        io_stats['samples'] += 1
+        io_stats['bytes_on_disk'] += on_disk
+        io_stats['bytes_read'] += on_disk
+        io_stats['bytes_kept'] += int(metrics.memory_usage(index=False).sum())
+        io_stats['row_groups_total'] += n_row_groups
+        io_stats['row_groups_read'] += n_row_groups
+        io_stats['rows_kept'] += len(metrics)
+
+    return metrics
+
+
+# columns of the per-sample manifest kept next to the metrics store
+## Note: fingerprint is the sample partition's fingerprint and targets the target snp fingerprint of the chromosome,
+## so a later release can tell which samples it can copy instead of reading them again
+MANIFEST_COLUMNS = ['SentrixBarcode_A', 'IID', 'chromosome', 'rows', 'fingerprint', 'targets', 'flush']
+
+
+# manifest of a metrics store, manifests written before fingerprints were recorded get empty fingerprint columns
+def read_manifest(manifest_path):
+    if not os.path.isfile(manifest_path):
+        return pd.DataFrame(columns=MANIFEST_COLUMNS)
+    manifest = pd.read_csv(manifest_path, sep='\t', dtype={'SentrixBarcode_A':str, 'IID':str, 'chromosome':str, 'fingerprint':str, 'targets':str, 'flush':str})
+    return manifest.reindex(columns=MANIFEST_COLUMNS)
+
+
+# fingerprint of one sample partition from its file names, sizes and modification times
+def partition_fingerprint(sample_path):
+    fingerprint = hashlib.sha1()
+    for root, dirs, files in os.walk(sample_path):
+        dirs.sort()
+        for file_name in sorted(files):
+            stat = os.stat(f'{root}/{file_name}')
+            fingerprint.update(f'{os.path.relpath(root, sample_path)}/{file_name}:{stat.st_size}:{stat.st_mtime_ns}'.encode())
+    return fingerprint.hexdigest()[:16]
+
+
+# fingerprint of the target snps (ID and pvar alleles) on each chromosome
+def target_fingerprints(target_snps, chrom_col='#CHROM'):
+    fingerprints = {}
+    for chrom, chrom_snps in target_snps.groupby(chrom_col):
+        snps = sorted(f'{snp}:{a2}:{a1}' for snp, a2, a1 in zip(chrom_snps['snpID'], chrom_snps['a2'], chrom_snps['a1']))
+        fingerprints[str(chrom)] = hashlib.sha1('\n'.join(snps).encode()).hexdigest()[:16]
+    return fingerprints
+
+
+# chromosomes of each planned sample that an earlier run (e.g. the previous release) extracted from the same partition
+# files with the same target snps, keyed by (barcode, IID) with the sample's partition fingerprint
+## Note: only samples in the previous manifest have their partition fingerprinted
+def reusable_chroms(previous_manifest, samples, target_hashes):
+    previous = previous_manifest.dropna(subset=['fingerprint','targets'])
+    previous_keys = set(zip(previous['SentrixBarcode_A'], previous['IID'], previous['chromosome'], previous['fingerprint'], previous['targets']))
+    previous_samples = set(zip(previous['SentrixBarcode_A'], previous['IID']))
+
+    reusable = {}
+    for sample in samples:
+        key = (str(sample['SentrixBarcode_A']), str(sample['IID']))
+        if key not in previous_samples:
+            continue
+        fingerprint = partition_fingerprint(sample['sample_path'])
+        chroms = [chrom for chrom in sample['chroms'] if (*key, str(chrom), fingerprint, target_hashes.get(str(chrom))) in previous_keys]
+        if len(chroms) > 0:
+            reusable[key] = (chroms, fingerprint)
+
+    return reusable
+
+
+# flush token of a store file named part-<run>-<flush>-<i>.parquet
+def _file_flush(file_name):
+    parts = file_name.split('-')
+    return f'{parts[1]}-{parts[2]}' if len(parts) == 4 else None
+
+
+# ancestries with a partition in the store
+def _store_ancestries(store_path):
+    if not os.path.isdir(store_path):
+        return []
+    return sorted(entry.name[len('ancestry='):] for entry in os.scandir(store_path) if entry.name.startswith('ancestry=') and entry.is_dir())
+
+
+# hold the manifest's lock file while appending to or rewriting the manifest
+## Note: per-chromosome swarm jobs writing to the same output directory share one manifest
+@contextmanager
+def _manifest_lock(manifest_path):
+    with open(f'{manifest_path}.lock', 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# rewrite the manifest on disk without the rows drop(manifest) flags, keeping rows other jobs appended meanwhile
+def _rewrite_manifest(manifest_path, drop):
+    with _manifest_lock(manifest_path):
+        manifest = read_manifest(manifest_path)
+        manifest = manifest[~drop(manifest)]
+        manifest.to_csv(f'{manifest_path}.tmp', sep='\t', index=False)
+        os.replace(f'{manifest_path}.tmp', manifest_path)
+    return manifest
+
+
+# incremental writer for the extracted metrics store
+## Note: metrics are buffered and flushed to new parquet files every batch_rows rows or flush_seconds seconds,
+## so memory stays bounded and a killed job only loses the current buffer
+## Note: with a manifest, every flushed (barcode, IID, chromosome) is recorded after its files are written; resuming
+## keeps those and drops files from flushes that never made it into the manifest, otherwise the partitions of the
+## chromosomes being written are cleared first (in every ancestry, also ones no longer extracted), like overwriting
+## the csv files
+## Note: with run stats every flush is timed as a store_write stage
+def new_metrics_store(store_path, ancestries, chroms, batch_rows=1000000, flush_seconds=300, manifest_path=None, resume=False, run_stats=None):
+    chroms = [str(chrom) for chrom in chroms]
+    manifest = read_manifest(manifest_path) if manifest_path else pd.DataFrame(columns=MANIFEST_COLUMNS)
+
+    # manifests from older runs are rewritten with the current columns before rows are appended to them
+    outdated = manifest_path and os.path.isfile(manifest_path) and (list(pd.read_csv(manifest_path, sep='\t', nrows=0).columns) != MANIFEST_COLUMNS)
+
+    if not resume:
+        manifest = manifest[~manifest['chromosome'].isin(chroms)]
+    if manifest_path and (not resume or outdated):
+        manifest = _rewrite_manifest(manifest_path, lambda manifest: manifest['chromosome'].isin(chroms) & (not resume))
+
+    flushed = set(manifest['flush'])
+    for ancestry in sorted(set(ancestries) | set(_store_ancestries(store_path))):
+        for chrom in chroms:
+            partition_path = f'{store_path}/ancestry={ancestry}/chromosome={chrom}'
+            if not os.path.isdir(partition_path):
+                continue
+            if not resume:
+                shutil.rmtree(partition_path)
+                continue
+            for file_name in os.listdir(partition_path):
+                # also removes temporary files of a store rewrite that was killed
+                if file_name.startswith('.') or (_file_flush(file_name) not in flushed):
+                    os.remove(f'{partition_path}/{file_name}')
+
+    return {
+        'path': store_path,
+        'run': uuid.uuid4().hex[:8],
+        'batch_rows': batch_rows,
+        'flush_seconds': flush_seconds,
+        'last_flush': time.time(),
+        'buffer': [],
+        'buffered_rows': 0,
+        'manifest_path': manifest_path,
+        'manifest': manifest,
+        'pending': [],
+        'flushes': 0,
+        'rows_written': 0,
+        'run_stats': run_stats
+    }
+
+
+# drop what a resumed run must not keep for its chromosomes: samples no longer in the sample plan, or planned under
+# another ancestry or phenotype, and with target_hashes chromosomes extracted for other target snps are removed from
+# the store and the manifest so they are not counted as done
+## Note: store files holding dropped rows are rewritten without them (removed when nothing is left), returns the
+## number of (sample, chromosome) entries and rows dropped
+## Note: manifest rows written before target fingerprints were recorded have no targets and are extracted again
+def prune_metrics_store(store, sample_plan, chroms, target_hashes=None):
+    chroms = [str(chrom) for chrom in chroms]
+    planned_samples = pd.MultiIndex.from_arrays([sample_plan['SentrixBarcode_A'].astype(str), sample_plan['IID'].astype(str)])
+    planned_labels = pd.MultiIndex.from_arrays([sample_plan['IID'].astype(str), sample_plan['label'].astype(str), sample_plan['gp2_phenotype'].astype(str)])
+
+    manifest = store['manifest']
+    in_run = manifest['chromosome'].isin(chroms)
+    stale = in_run & ~pd.MultiIndex.from_arrays([manifest['SentrixBarcode_A'].astype(str), manifest['IID'].astype(str)]).isin(planned_samples)
+    if target_hashes is not None:
+        stale = stale | (in_run & (manifest['targets'].astype(object).values != manifest['chromosome'].map(target_hashes).astype(object).values))
+    stale_ids = {chrom: set(manifest.loc[stale & (manifest['chromosome'] == chrom), 'IID']) for chrom in chroms}
+
+    rows_dropped = 0
+    for ancestry in _store_ancestries(store['path']):
+        for chrom in chroms:
+            partition_path = f'{store["path"]}/ancestry={ancestry}/chromosome={chrom}'
+            if not os.path.isdir(partition_path):
+                continue
+            for file_name in sorted(os.listdir(partition_path)):
+                if file_name.startswith('.'):
+                    continue
+                file_path = f'{partition_path}/{file_name}'
+                rows = pq.read_table(file_path, columns=['Sample_ID','phenotype']).to_pandas()
+                sample_ids = rows['Sample_ID'].astype(str)
+                keep = pd.MultiIndex.from_arrays([sample_ids, np.full(len(rows), ancestry), rows['phenotype'].astype(str)]).isin(planned_labels)
+                keep = keep & ~sample_ids.isin(stale_ids[chrom]).values
+                if keep.all():
+                    continue
+
+                stale_ids[chrom].update(sample_ids[~keep])
+                rows_dropped += int((~keep).sum())
+                if keep.any():
+                    # write next to the file (hidden from dataset reads) and rename over it
+                    pq.write_table(pq.read_table(file_path).filter(pa.array(keep)), f'{partition_path}/.{file_name}.tmp')
+                    os.replace(f'{partition_path}/.{file_name}.tmp', file_path)
+                else:
+                    os.remove(file_path)
+
+    # samples whose rows were dropped are extracted again
+    stale_keys = pd.MultiIndex.from_arrays([[chrom for chrom, iids in stale_ids.items() for iid in iids], [iid for iids in stale_ids.values() for iid in iids]])
+    def drop(manifest):
+        return pd.MultiIndex.from_arrays([manifest['chromosome'].astype(str), manifest['IID'].astype(str)]).isin(stale_keys)
+
+    n_dropped = int(drop(manifest).sum())
+    if n_dropped > 0:
+        store['manifest'] = _rewrite_manifest(store['manifest_path'], drop) if store['manifest_path'] else manifest[~drop(manifest)]
+
+    return n_dropped, rows_dropped
+
+
+# chromosomes already in the store for each (barcode, IID)
+def completed_chroms(store):
+    manifest = store['manifest']
+    return manifest.groupby(['SentrixBarcode_A','IID'])['chromosome'].agg(set).to_dict()
+
+
+# buffer one sample's metrics, recording the sample (with its partition and target fingerprints) in the manifest once
+# they are flushed
+def append_metrics(store, ancestry, metrics, barcode=None, iid=None, chroms=(), fingerprint=None, target_hashes=None):
+    metrics = metrics.assign(ancestry=ancestry)
+    store['buffer'].append(metrics)
+    store['buffered_rows'] += len(metrics)
+
+    target_hashes = target_hashes or {}
+    chrom_rows = metrics['chromosome'].astype(str).value_counts()
+    for chrom in chroms:
+        store['pending'].append([str(barcode), str(iid), str(chrom), chrom_rows.get(str(chrom), 0), fingerprint, target_hashes.get(str(chrom))])
+
+    if (store['buffered_rows'] >= store['batch_rows']) or (time.time() - store['last_flush'] >= store['flush_seconds']):
+        flush_metrics_store(store)
+
+
+def flush_metrics_store(store):
+    flush = f'{store["run"]}-{store["flushes"]:05d}'
+
+    if store['buffered_rows'] > 0:
+        with stage(store['run_stats'], 'store_write', flush=flush, rows=store['buffered_rows']):
+            metrics = pd.concat(store['buffer'], axis=0, ignore_index=True)
+            metrics = pa.Table.from_pandas(metrics[METRICS_STORE_SCHEMA.names], schema=METRICS_STORE_SCHEMA, preserve_index=False)
+
+            ds.write_dataset(
+                metrics,
+                store['path'],
+                format='parquet',
+                partitioning=METRICS_STORE_PARTITIONING,
+                basename_template=f'part-{flush}-{{i}}.parquet',
+                existing_data_behavior='overwrite_or_ignore'
+            )
+        store['rows_written'] += metrics.num_rows
+        count(store['run_stats'], 'rows_written', metrics.num_rows)
+
+    # record flushed samples only after their files are on disk
+    if store['manifest_path'] and store['pending']:
+        pending = pd.DataFrame(store['pending'], columns=MANIFEST_COLUMNS[:-1]).assign(flush=flush)
+        with _manifest_lock(store['manifest_path']):
+            pending.to_csv(store['manifest_path'], sep='\t', index=False, mode='a', header=not os.path.isfile(store['manifest_path']))
+        store['manifest'] = pd.concat([store['manifest'], pending], axis=0, ignore_index=True)
+
+    store['flushes'] += 1
+    store['last_flush'] = time.time()
+    store['buffer'] = []
+    store['buffered_rows'] = 0
+    store['pending'] = []
+
+
+# read the extracted metrics store, optionally only some ancestries/chromosomes/samples/columns
+def read_metrics_store(store_path, ancestries=None, chroms=None, columns=None, sample_ids=None):
+    dataset = ds.dataset(store_path, format='parquet', partitioning=METRICS_STORE_PARTITIONING)
+
+    row_filter = None
+    if ancestries is not None:
+        row_filter = ds.field('ancestry').isin(list(ancestries))
+    if chroms is not None:
+        chrom_filter = ds.field('chromosome').isin([str(chrom) for chrom in chroms])
+        row_filter = chrom_filter if row_filter is None else row_filter & chrom_filter
+    if sample_ids is not None:
+        sample_filter = ds.field('Sample_ID').isin([str(sample_id) for sample_id in sample_ids])
+        row_filter = sample_filter if row_filter is None else row_filter & sample_filter
+
+    return dataset.to_table(columns=columns, filter=row_filter).to_pandas()
+
+
+# join extracted metrics to the target variant index in both allele orientations and sort rows by variant ID
+## Note: rows are matched on chr:pos:a2:a1 and chr:pos:a1:a2, so a row can be kept under both IDs if both are annotated
+def build_variant_store(snp_metrics, target_index):
+    target_ids = pd.Index(target_index['merge_id'].unique())
+    merge_id1 = variant_id(snp_metrics['chromosome'], snp_metrics['position'], snp_metrics['a2'], snp_metrics['a1'])
+    merge_id2 = variant_id(snp_metrics['chromosome'], snp_metrics['position'], snp_metrics['a1'], snp_metrics['a2'])
+    hits1 = pd.Index(merge_id1).isin(target_ids)
+    hits2 = pd.Index(merge_id2).isin(target_ids)
+
+    path_metrics1 = snp_metrics[hits1].assign(merge_id=merge_id1[hits1])
+    path_metrics2 = snp_metrics[hits2].assign(merge_id=merge_id2[hits2])
+
+    path_metrics = pd.concat([path_metrics1, path_metrics2], axis=0).drop_duplicates()
+    path_metrics = path_metrics.sort_values('merge_id', kind='stable').reset_index(drop=True)
+
+    # plain strings so plots and tables see the same values as the csv metrics
+    for col in path_metrics.columns:
+        if isinstance(path_metrics[col].dtype, pd.CategoricalDtype) or (col == 'chromosome'):
+            path_metrics[col] = path_metrics[col].astype(str)
+
+    # offset index: first row and number of rows of each variant
+    store_index = path_metrics.groupby('merge_id', sort=False).size().rename('rows').to_frame()
+    store_index['offset'] = store_index['rows'].cumsum() - store_index['rows']
+    store_index['fingerprint'] = variant_fingerprints(path_metrics, store_index['offset'].values)
+
+    return {
+        'metrics': pa.Table.from_pandas(path_metrics, preserve_index=False),
+        'index': store_index[['offset','rows','fingerprint']]
+    }
+
+
+# columns whose values make up a variant's fingerprint
+FINGERPRINT_COLUMNS = ['Sample_ID', 'ancestry', 'phenotype', 'GT', 'Theta', 'R', 'GenTrain_Score']
+
+
+# order-independent fingerprint of each variant's rows in a store sorted by variant (wrapping sum of row hashes)
+## Note: two releases give a variant the same fingerprint when it has the same samples with the same values, so
+## unchanged variants can be skipped when re-aggregating, re-rendering and diffing
+def variant_fingerprints(path_metrics, offsets):
+    columns = [col for col in FINGERPRINT_COLUMNS if col in path_metrics.columns]
+    row_hashes = pd.util.hash_pandas_object(path_metrics[columns], index=False).values
+    if len(row_hashes) == 0:
+        return []
+    return [f'{fingerprint:016x}' for fingerprint in np.add.reduceat(row_hashes, offsets)]
+
+
+# variant store layout: metrics.arrow (uncompressed arrow IPC, memory mapped on read), index.tsv and, when it has
+# been computed, the per-ancestry/phenotype genotype summary in genotype_summary.parquet
+## Note: the summary is parquet so frequencies copied from a previous store keep every bit (stores written before
+## this have genotype_summary.tsv, which is still read)
+def write_variant_store(variant_store, variant_store_path):
+    os.makedirs(variant_store_path, exist_ok=True)
+
+    with pa.ipc.new_file(f'{variant_store_path}/metrics.arrow', variant_store['metrics'].schema) as writer:
+        writer.write_table(variant_store['metrics'])
+
+    variant_store['index'].to_csv(f'{variant_store_path}/index.tsv', sep='\t')
+
+    if variant_store.get('summary') is not None:
+        pq.write_table(pa.Table.from_pandas(variant_store['summary'], preserve_index=False), f'{variant_store_path}/genotype_summary.parquet')
+        if os.path.isfile(f'{variant_store_path}/genotype_summary.tsv'):
+            os.remove(f'{variant_store_path}/genotype_summary.tsv')
+
+
+def open_variant_store(variant_store_path):
+    metrics = pa.ipc.open_file(pa.memory_map(f'{variant_store_path}/metrics.arrow', 'r')).read_all()
+    store_index = pd.read_csv(f'{variant_store_path}/index.tsv', sep='\t', index_col='merge_id', dtype={'fingerprint':str})
+
+    summary = None
+    if os.path.isfile(f'{variant_store_path}/genotype_summary.parquet'):
+        summary = pq.read_table(f'{variant_store_path}/genotype_summary.parquet').to_pandas()
+    elif os.path.isfile(f'{variant_store_path}/genotype_summary.tsv'):
+        summary = pd.read_csv(f'{variant_store_path}/genotype_summary.tsv', sep='\t', dtype={'ancestry':str, 'phenotype':str}, keep_default_na=False, na_values=[''], float_precision='round_trip')
+
+    return {
+        'metrics': metrics,
+        'index': store_index,
+        'summary': summary
+    }
+
+
+# rows of one variant, read straight from its offset in the store
+def read_variant(variant_store, merge_id):
+    offset, rows = variant_store['index'].loc[merge_id, ['offset','rows']]
+    return variant_store['metrics'].slice(int(offset), int(rows)).to_pandas()
@@ -0,0 +1,168 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+# GP2 Pathogenic Variant Analysis
+
+# - **Project:** Parkinson’s Disease Pathogenic Variants: Cross-Ancestry Analysis and Microarray Data Validation
+# - **Version:** Python/3.10.15
+
+## Script Overview
+
+# Shared helpers to compute cluster plot quality metrics directly from extracted R/Theta/GT values, and per-ancestry,
+# per-phenotype genotype count/frequency summaries, used by 03_pathogenic_variants_cluster_plot_viewer.py,
+# 04_pathogenic_variants_cluster_plot_metrics.py and 05_build_pathogenic_variants_store.py
+
+## CHANGELOG
+
+# 18-OCT-2026: Script started
+
+
+# called genotypes in Theta order (AA low Theta, BB high Theta)
+GENOTYPES = ['AA', 'AB', 'BB']
+
+# thresholds for the provisional classification
+## Note: these only triage variants for review, final classifications still come from looking at the cluster plots
+MIN_CALL_RATE = 0.95
+MIN_SEPARATION = 2.0
+MIN_GENTRAIN = 0.5
+MIN_CARRIER_CLUSTER = 3
+
+# floor on cluster spread so single-sample clusters don't divide by zero
+MIN_SPREAD = 0.01
+
+# groups of the genotype summary within each variant
+SUMMARY_GROUPS = ['ancestry', 'phenotype']
+
+# genotype count columns of the genotype summary, summed when groups are collapsed
+SUMMARY_COUNTS = ['n_samples', 'AA_n', 'AB_n', 'BB_n', 'n_nc']
+
+
+# per-variant cluster statistics from one grouped pass over all variants
+## Note: 'BA' calls are counted as 'AB'
+def cluster_metrics(path_metrics, variant_col='merge_id'):
+    gt = path_metrics['GT'].astype(str).replace({'BA':'AB'})
+    metrics = pd.DataFrame({
+        variant_col: path_metrics[variant_col].values,
+        'GT': gt.values,
+        'Theta': path_metrics['Theta'].astype('float64').values,
+        'R': path_metrics['R'].astype('float64').values,
+        'GenTrain_Score': path_metrics['GenTrain_Score'].astype('float64').values
+    })
+
+    # centroid and spread of every genotype cluster of every variant
+    clusters = metrics.groupby([variant_col, 'GT'], sort=False).agg(
+        n=('Theta', 'size'),
+        theta_mean=('Theta', 'mean'),
+        theta_sd=('Theta', 'std'),
+        r_mean=('R', 'mean'),
+        r_sd=('R', 'std')
+    )
+    clusters = clusters.unstack('GT')
+    clusters.columns = [f'{genotype}_{stat}' for stat, genotype in clusters.columns]
+
+    variants = metrics.groupby(variant_col, sort=False).agg(
+        n_samples=('GT', 'size'),
+        gentrain_mean=('GenTrain_Score', 'mean'),
+        gentrain_min=('GenTrain_Score', 'min')
+    )
+
+    for genotype in GENOTYPES + ['NC']:
+        for stat in ['n', 'theta_mean', 'theta_sd', 'r_mean', 'r_sd']:
+            col = f'{genotype}_{stat}'
+            variants[col] = clusters[col] if col in clusters.columns else np.nan
+        variants[f'{genotype}_n'] = variants[f'{genotype}_n'].fillna(0).astype(int)
+
+    variants = variants.rename(columns={'NC_n':'n_nc'})
+    variants = variants.drop(columns=[f'NC_{stat}' for stat in ['theta_mean', 'theta_sd', 'r_mean', 'r_sd']])
+
+    # call rate and B allele frequency from the genotype counts
+    variants = genotype_frequencies(variants)
+
+    # separation of neighbouring genotype clusters in Theta: centroid gap over the summed spreads
+    separations = []
+    for left, right in [('AA', 'AB'), ('AB', 'BB'), ('AA', 'BB')]:
+        gap = (variants[f'{right}_theta_mean'] - variants[f'{left}_theta_mean']).abs()
+        spread = variants[f'{left}_theta_sd'].fillna(0).clip(lower=MIN_SPREAD) + variants[f'{right}_theta_sd'].fillna(0).clip(lower=MIN_SPREAD)
+        separation = gap / spread
+        # AA-BB only counts when there is no AB cluster in between
+        if (left, right) == ('AA', 'BB'):
+            separation = separation.where(variants['AB_n'] == 0)
+        separations.append(separation)
+    variants['separation'] = pd.concat(separations, axis=1).min(axis=1)
+
+    variants['classification'] = provisional_classification(variants)
+
+    return variants.reset_index()
+
+
+# provisional classification: fail on low call rate/GenTrain or overlapping clusters, review small carrier clusters
+def provisional_classification(variants):
+    n_carriers = variants['AB_n'] + variants['BB_n']
+    fail = (variants['call_rate'] < MIN_CALL_RATE) | (variants['gentrain_mean'] < MIN_GENTRAIN) | (variants['separation'] < MIN_SEPARATION)
+    review = (n_carriers > 0) & (n_carriers < MIN_CARRIER_CLUSTER)
+
+    classification = np.where(fail, 'fail', np.where(review, 'review', 'pass'))
+    return pd.Series(classification, index=variants.index)
+
+
+# call rate, missingness, B allele frequency and MAF from genotype counts
+def genotype_frequencies(counts):
+    n_called = counts['AA_n'] + counts['AB_n'] + counts['BB_n']
+    counts['call_rate'] = n_called / counts['n_samples']
+    counts['missingness'] = 1 - counts['call_rate']
+    counts['b_freq'] = (counts['AB_n'] + 2 * counts['BB_n']) / (2 * n_called.replace(0, np.nan))
+    counts['maf'] = np.minimum(counts['b_freq'], 1 - counts['b_freq'])
+    return counts
+
+
+# per-variant, per-ancestry, per-phenotype genotype counts, B allele frequency and call rate from one grouped pass
+## Note: 'BA' calls are counted as 'AB', groups missing from the metrics (e.g. no ancestry in the merged txt file)
+## are labelled 'all'
+def genotype_summary(path_metrics, variant_col='merge_id', group_cols=SUMMARY_GROUPS):
+    keys = {variant_col: path_metrics[variant_col].values}
+    for col in group_cols:
+        keys[col] = path_metrics[col].astype(str).values if col in path_metrics.columns else 'all'
+    keys['GT'] = path_metrics['GT'].astype(str).replace({'BA':'AB'}).values
+
+    counts = pd.DataFrame(keys).groupby([variant_col] + group_cols + ['GT']).size().unstack('GT', fill_value=0)
+
+    summary = pd.DataFrame({'n_samples': counts.sum(axis=1)})
+    for genotype in GENOTYPES + ['NC']:
+        summary[f'{genotype}_n'] = counts[genotype] if genotype in counts.columns else 0
+    summary = summary.rename(columns={'NC_n':'n_nc'})
+
+    return genotype_frequencies(summary.reset_index())
+
+
+# genotype summary of a variant store, reading only the columns it needs from the arrow table
+## Note: with a previous store (e.g. the previous release), variants whose fingerprint is unchanged keep their
+## previous summary rows and only new or changed variants are aggregated
+def variant_store_summary(variant_store, variant_col='merge_id', previous_store=None):
+    metrics = variant_store['metrics']
+    columns = [col for col in [variant_col, 'GT'] + SUMMARY_GROUPS if col in metrics.column_names]
+
+    unchanged = pd.Index([])
+    if (previous_store is not None) and (previous_store.get('summary') is not None) and ('fingerprint' in previous_store['index'].columns) and ('fingerprint' in variant_store['index'].columns):
+        fingerprints = variant_store['index']['fingerprint']
+        previous_fingerprints = previous_store['index']['fingerprint'].reindex(fingerprints.index)
+        unchanged = fingerprints.index[fingerprints.values == previous_fingerprints.values]
+
+    if len(unchanged) == 0:
+        return genotype_summary(metrics.select(columns).to_pandas(), variant_col=variant_col)
+
+    changed_rows = ~pd.Index(metrics.column(variant_col).to_numpy(zero_copy_only=False)).isin(unchanged)
+    summary = previous_store['summary'][previous_store['summary'][variant_col].isin(unchanged)]
+
+    ## Note: concatenating an empty summary would turn the count columns into floats
+    if changed_rows.any():
+        changed = genotype_summary(metrics.filter(pa.array(changed_rows)).select(columns).to_pandas(), variant_col=variant_col)
+        summary = pd.concat([summary, changed], axis=0, ignore_index=True)
+
+    return summary.sort_values([variant_col] + SUMMARY_GROUPS, kind='stable').reset_index(drop=True)
+
+
+# sum the genotype summary over the groups not in by (e.g. per variant and ancestry across phenotypes)
+def collapse_genotype_summary(summary, by):
+    counts = summary.groupby(by)[SUMMARY_COUNTS].sum()
+    return genotype_frequencies(counts.reset_index())
@@ -0,0 +1,245 @@
+import os
+import sys
+import hashlib
+import inspect
+import threading
+from functools import partial
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import plotly.express as px
+from pathogenic_variants_io import open_variant_store, read_variant
+from pathogenic_variants_profiling import new_run_stats, stage
+
+# GP2 Pathogenic Variant Analysis
+
+# - **Project:** Parkinson’s Disease Pathogenic Variants: Cross-Ancestry Analysis and Microarray Data Validation
+# - **Version:** Python/3.10.15
+
+## Script Overview
+
+# Shared cluster plot helpers used by 03_pathogenic_variants_cluster_plot_viewer.py and
+# 06_render_pathogenic_variants_cluster_plots.py
+
+## CHANGELOG
+
+# 9-OCT-2024: plot_clusters started in 03_pathogenic_variants_cluster_plot_viewer.py
+# 18-OCT-2026: Moved here with the cached batch renderer helpers
+# 18-OCT-2026: WebGL rendering and density-binned downsampling for variants with many samples
+# 18-OCT-2026: Process-wide LRU plot cache with a memory cap and background prefetching for the viewer
+
+
+# thin dense genotype clusters to at most max_points points by keeping one point per occupied Theta/R grid cell
+## Note: NC and rare genotypes (< rare_fraction of samples) are always kept in full, the grid is coarsened until the
+## thinned clusters fit in the remaining budget
+## Note: rows with missing or infinite Theta/R can't be binned, they are passed through and plotly skips them
+def downsample_clusters(df, x_col, y_col, gtype_col, max_points, xlim, ylim, keep_genotypes=('NC',), rare_fraction=0.01):
+    if len(df) <= max_points:
+        return df
+
+    gtype_counts = df[gtype_col].value_counts()
+    rare_genotypes = gtype_counts[gtype_counts < max(1, rare_fraction * len(df))].index
+    keep_all = df[gtype_col].isin(list(keep_genotypes)) | df[gtype_col].isin(rare_genotypes)
+    keep_all = keep_all | ~np.isfinite(df[[x_col, y_col]].astype('float64')).all(axis=1)
+
+    dense = df[~keep_all]
+    budget = max(0, max_points - keep_all.sum())
+
+    bins = 256
+    while True:
+        x_bin = np.clip(((dense[x_col] - xlim[0]) / (xlim[1] - xlim[0]) * bins).astype(int), 0, bins - 1)
+        y_bin = np.clip(((dense[y_col] - ylim[0]) / (ylim[1] - ylim[0]) * bins).astype(int), 0, bins - 1)
+        thinned = dense.groupby([dense[gtype_col], dense['phenotype'], x_bin, y_bin], sort=False, observed=True).head(1)
+        if (len(thinned) <= budget) or (bins <= 8):
+            break
+        bins //= 2
+
+    return pd.concat([df[keep_all], thinned], axis=0).sort_index()
+
+
+# cluster plot function
+## Note: above webgl_threshold points the scatter is drawn with WebGL, above max_points dense clusters are downsampled
+def plot_clusters(df, x_col='theta', y_col='r', gtype_col='gt', title='snp plot', max_points=None, webgl_threshold=1000):
+    d3 = px.colors.qualitative.D3
+
+    cmap = {
+        'AA': d3[0],
+        'AB': d3[1],
+        'BA': d3[1],
+        'BB': d3[2],
+        'NC': d3[3]
+    }
+
+    # custom limits to make plots look good for publication
+    xlim = [0-.2, 1.2]
+    ylim = [0-.1, 2.6]
+
+    lmap = {'r':'R','theta':'Theta'}
+    smap = {'Control':'circle','PD':'diamond-open-dot'}
+
+    # bound the number of points sent to the browser for large variants
+    n_points = len(df)
+    if max_points is not None:
+        df = downsample_clusters(df, x_col, y_col, gtype_col, max_points, xlim, ylim)
+    render_mode = 'webgl' if len(df) > webgl_threshold else 'auto'
+
+    # plot and update axes for aesthetics
+    fig = px.scatter(df, x=x_col, y=y_col, color=gtype_col, color_discrete_map=cmap, width=650, height=497, labels=lmap, symbol='phenotype', symbol_map=smap, render_mode=render_mode)
+
+    fig.update_xaxes(range=xlim, nticks=10, zeroline=False)
+    fig.update_yaxes(range=ylim, nticks=10, zeroline=False)
+    
+    fig.update_layout(margin=dict(r=76, t=63, b=75))
+
+
+    fig.update_layout(legend_title_text='Genotype')
+
+    out_dict = {
+        'fig': fig,
+        'xlim': xlim,
+        'ylim': ylim,
+        'n_points': n_points,
+        'n_plotted': len(df)
+    }
+    
+    fig.update_layout(title_text=f'<b>{title}<b>')
+    
+    return out_dict
+
+
+# process-wide LRU cache of viewer cluster plots, shared by every session of the app
+## Note: entries are sized by their plotly JSON and the least recently used plots are dropped once max_bytes is
+## exceeded; plots being prefetched are tracked in pending so a session asking for one waits for it instead of
+## building it twice
+def new_plot_cache(max_bytes, prefetch_workers=2):
+    return {
+        'entries': OrderedDict(),
+        'bytes': 0,
+        'max_bytes': max_bytes,
+        'pending': {},
+        'lock': threading.RLock(),
+        'pool': ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix='plot-prefetch'),
+        'hits': 0,
+        'misses': 0,
+        'prefetch_errors': 0
+    }
+
+
+def _build_plot(variant_store, merge_id, max_points):
+    snp_df = read_variant(variant_store, merge_id)
+    plot = plot_clusters(snp_df, x_col='Theta', y_col='R', gtype_col='GT', title=merge_id, max_points=max_points)
+    plot['nbytes'] = len(plot['fig'].to_json())
+    return plot
+
+
+def _cache_plot(plot_cache, key, plot):
+    with plot_cache['lock']:
+        if key in plot_cache['entries']:
+            return plot_cache['entries'][key]
+
+        plot_cache['entries'][key] = plot
+        plot_cache['bytes'] += plot['nbytes']
+        while (plot_cache['bytes'] > plot_cache['max_bytes']) and (len(plot_cache['entries']) > 1):
+            _, evicted = plot_cache['entries'].popitem(last=False)
+            plot_cache['bytes'] -= evicted['nbytes']
+
+    return plot
+
+
+# cluster plot of one variant from the cache, built (or taken from its prefetch) on a miss
+## Note: store_key identifies the variant store version so plots of a rebuilt store are not served from the cache
+## Note: if the variant's prefetch failed the plot is built again here, so errors show up in the session asking for it
+def cached_plot(plot_cache, variant_store, merge_id, max_points=None, store_key=None):
+    key = (store_key, merge_id, max_points)
+    with plot_cache['lock']:
+        if key in plot_cache['entries']:
+            plot_cache['entries'].move_to_end(key)
+            plot_cache['hits'] += 1
+            return plot_cache['entries'][key]
+        plot_cache['misses'] += 1
+        future = plot_cache['pending'].get(key)
+
+    if (future is not None) and (future.exception() is None):
+        plot = future.result()
+    else:
+        plot = _build_plot(variant_store, merge_id, max_points)
+    return _cache_plot(plot_cache, key, plot)
+
+
+# cache a finished prefetch, failed prefetches are counted and printed to stderr
+def _prefetch_done(plot_cache, key, future):
+    with plot_cache['lock']:
+        plot_cache['pending'].pop(key, None)
+        if future.exception() is not None:
+            plot_cache['prefetch_errors'] += 1
+    if future.exception() is None:
+        _cache_plot(plot_cache, key, future.result())
+    else:
+        print(f'Prefetching the cluster plot of {key[1]} failed: {future.exception()!r}', file=sys.stderr)
+
+
+# build the plots of variants likely to be viewed next in background threads
+def prefetch_plots(plot_cache, variant_store, merge_ids, max_points=None, store_key=None):
+    with plot_cache['lock']:
+        for merge_id in merge_ids:
+            key = (store_key, merge_id, max_points)
+            if (key in plot_cache['entries']) or (key in plot_cache['pending']):
+                continue
+            future = plot_cache['pool'].submit(_build_plot, variant_store, merge_id, max_points)
+            plot_cache['pending'][key] = future
+            future.add_done_callback(partial(_prefetch_done, plot_cache, key))
+
+
+# columns that change what a variant's cluster plot looks like
+PLOT_COLUMNS = ['Theta', 'R', 'GT', 'phenotype']
+
+
+# content hash of a variant's plot: its plotted rows, its title and the plot_clusters code
+## Note: with the variant's fingerprint from the store index (which covers the plotted columns) the rows don't have to
+## be read, snp_df can be None
+def plot_hash(snp_df, title, fingerprint=None):
+    content = hashlib.sha1(inspect.getsource(plot_clusters).encode())
+    content.update(title.encode())
+    if fingerprint is not None:
+        content.update(f'fingerprint:{fingerprint}'.encode())
+    else:
+        content.update(pd.util.hash_pandas_object(snp_df[PLOT_COLUMNS].astype(str), index=False).values.tobytes())
+    return content.hexdigest()
+
+
+def read_render_cache(render_cache_path):
+    if not os.path.isfile(render_cache_path):
+        return {}
+    render_cache = pd.read_csv(render_cache_path, sep='\t')
+    return dict(zip(render_cache['merge_id'], render_cache['hash']))
+
+
+def write_render_cache(render_cache, render_cache_path):
+    render_cache = pd.DataFrame({'merge_id': list(render_cache.keys()), 'hash': list(render_cache.values())})
+    render_cache.to_csv(render_cache_path, sep='\t', index=False)
+
+
+# per-worker state for the batch renderer: the memory mapped variant store and one kaleido/chrome instance
+_render_state = {}
+
+
+def start_renderer(variant_store_path, plots_dir):
+    _render_state['variant_store'] = open_variant_store(variant_store_path)
+    _render_state['plots_dir'] = plots_dir
+
+    # kaleido>=1.0 starts chrome on every write unless a sync server is kept running, older kaleido keeps its own scope
+    import kaleido
+    if hasattr(kaleido, 'start_sync_server'):
+        kaleido.start_sync_server(silence_warnings=True)
+
+
+# render one variant's PNG, returning its merge ID and the worker-side plot build/write timings
+def render_variant(merge_id):
+    run_stats = new_run_stats('render_variant')
+    with stage(run_stats, 'plot_build', log=False):
+        snp_df = read_variant(_render_state['variant_store'], merge_id)
+        fig = plot_clusters(snp_df, x_col='Theta', y_col='R', gtype_col='GT', title=merge_id)['fig']
+    with stage(run_stats, 'plot_write', log=False):
+        fig.write_image(f'{_render_state["plots_dir"]}/{merge_id}.png')
+    return merge_id, run_stats
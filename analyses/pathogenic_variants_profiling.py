@@ -0,0 +1,166 @@
+import os
+import sys
+import json
+import time
+import uuid
+import socket
+import resource
+import datetime
+import cProfile
+from contextlib import contextmanager
+
+# GP2 Pathogenic Variant Analysis
+
+# - **Project:** Parkinson’s Disease Pathogenic Variants: Cross-Ancestry Analysis and Microarray Data Validation
+# - **Version:** Python/3.10.15
+
+## Script Overview
+
+# Shared instrumentation for the pipeline scripts: per-stage timings, counters and peak memory written as JSON lines,
+# with an optional cProfile/pyinstrument dump of the whole run
+
+## CHANGELOG
+
+# 18-OCT-2026: Script started
+
+
+# --profile-log/--profile/--profile-out options shared by every instrumented script
+def add_profiling_args(parser):
+    parser.add_argument('--profile-log', type=str, default=None, help='Append per-stage timings, counters and peak memory to this file as JSON lines')
+    parser.add_argument('--profile', type=str, default=None, choices=['cprofile', 'pyinstrument'], help='Profile the whole run')
+    parser.add_argument('--profile-out', type=str, default=None, help='Profile output (default: <script>.prof for cprofile, <script>.html for pyinstrument)')
+
+
+# stage timings and counters of one run, or of one pool worker's share of it
+## Note: a plain dict so worker stats can be returned from the pool and merged like the io stats
+def new_run_stats(script, log_path=None):
+    return {
+        'script': script,
+        'run': uuid.uuid4().hex[:8],
+        'host': socket.gethostname(),
+        'pid': os.getpid(),
+        'start': time.time(),
+        'log_path': log_path,
+        'stages': {},
+        'counters': {}
+    }
+
+
+# peak RSS of this process and of its finished child processes (pool workers), in bytes
+## Note: ru_maxrss is in KiB on Linux
+def peak_rss():
+    return {
+        'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'peak_rss_children_bytes': resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    }
+
+
+# append one JSON line to the run's log (no-op without a log path)
+def log_event(run_stats, event, **fields):
+    if not run_stats['log_path']:
+        return
+
+    record = {
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'script': run_stats['script'],
+        'run': run_stats['run'],
+        'host': run_stats['host'],
+        'pid': run_stats['pid'],
+        'event': event
+    }
+    record.update(fields)
+
+    with open(run_stats['log_path'], 'a') as f:
+        f.write(json.dumps(record, default=str) + '\n')
+
+
+def record_stage(run_stats, name, seconds, cpu_seconds=0.0, calls=1):
+    stage_stats = run_stats['stages'].setdefault(name, {'calls': 0, 'seconds': 0.0, 'cpu_seconds': 0.0, 'max_seconds': 0.0})
+    stage_stats['calls'] += calls
+    stage_stats['seconds'] += seconds
+    stage_stats['cpu_seconds'] += cpu_seconds
+    stage_stats['max_seconds'] = max(stage_stats['max_seconds'], seconds)
+
+
+# time a block of code as one call of a stage
+## Note: with log=True each call is also written as its own JSON line as soon as it ends, so a job killed at its wall
+## time limit still leaves the finished stages behind; stages run per sample/variant keep log=False and only show up
+## in the totals written by finish_run
+## Note: without run stats (None) the block just runs, so shared helpers can take run_stats=None
+@contextmanager
+def stage(run_stats, name, log=True, **fields):
+    if run_stats is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        cpu_seconds = time.process_time() - cpu_start
+        record_stage(run_stats, name, seconds, cpu_seconds)
+        if log:
+            log_event(run_stats, 'stage', stage=name, seconds=round(seconds, 6), cpu_seconds=round(cpu_seconds, 6), **fields, **peak_rss())
+
+
+def count(run_stats, name, n=1):
+    if run_stats is None:
+        return
+    run_stats['counters'][name] = run_stats['counters'].get(name, 0) + int(n)
+
+
+# add a worker's stage totals and counters to the run's
+## Note: stage seconds from several workers add up to more than the wall time of the run
+def merge_run_stats(run_stats, other):
+    for name, other_stage in other['stages'].items():
+        record_stage(run_stats, name, other_stage['seconds'], other_stage['cpu_seconds'], other_stage['calls'])
+        run_stats['stages'][name]['max_seconds'] = max(run_stats['stages'][name]['max_seconds'], other_stage['max_seconds'])
+    for name, n in other['counters'].items():
+        count(run_stats, name, n)
+
+
+# start stats (and the profiler if asked for) for a script run with add_profiling_args options
+def start_run(script, args):
+    run_stats = new_run_stats(script, log_path=args.profile_log)
+    log_event(run_stats, 'start', argv=sys.argv[1:])
+
+    run_stats['profiler'] = None
+    if args.profile == 'cprofile':
+        run_stats['profiler'] = cProfile.Profile()
+        run_stats['profiler'].enable()
+    elif args.profile == 'pyinstrument':
+        # optional, only needed for --profile pyinstrument
+        from pyinstrument import Profiler
+        run_stats['profiler'] = Profiler()
+        run_stats['profiler'].start()
+    run_stats['profile'] = args.profile
+    run_stats['profile_out'] = args.profile_out or f'{script}.{"html" if args.profile == "pyinstrument" else "prof"}'
+
+    return run_stats
+
+
+# stop the profiler, write the stage totals/counters/peak memory and print them to stderr
+def finish_run(run_stats, file=sys.stderr):
+    if run_stats['profile'] == 'cprofile':
+        run_stats['profiler'].disable()
+        run_stats['profiler'].dump_stats(run_stats['profile_out'])
+    elif run_stats['profile'] == 'pyinstrument':
+        run_stats['profiler'].stop()
+        with open(run_stats['profile_out'], 'w') as f:
+            f.write(run_stats['profiler'].output_html())
+
+    wall_seconds = time.time() - run_stats['start']
+    memory = peak_rss()
+
+    for name, stage_stats in run_stats['stages'].items():
+        log_event(run_stats, 'stage_total', stage=name, **{key: round(value, 6) for key, value in stage_stats.items()})
+    log_event(run_stats, 'finish', wall_seconds=round(wall_seconds, 6), counters=run_stats['counters'], **memory)
+
+    print(f'{"Stage":<24} {"calls":>8} {"seconds":>10} {"cpu":>10} {"max":>10}', file=file)
+    for name, stage_stats in run_stats['stages'].items():
+        print(f'{name:<24} {stage_stats["calls"]:>8} {stage_stats["seconds"]:>10.2f} {stage_stats["cpu_seconds"]:>10.2f} {stage_stats["max_seconds"]:>10.2f}', file=file)
+    for name, n in run_stats['counters'].items():
+        print(f'{name}: {n}', file=file)
+    print(f'Wall time: {wall_seconds:.2f} s, peak RSS: {memory["peak_rss_bytes"] / 2**20:.1f} MiB (workers: {memory["peak_rss_children_bytes"] / 2**20:.1f} MiB)', file=file)
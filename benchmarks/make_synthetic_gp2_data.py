@@ -0,0 +1,180 @@
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# GP2 Pathogenic Variant Analysis
+
+# - **Project:** Parkinson’s Disease Pathogenic Variants: Cross-Ancestry Analysis and Microarray Data Validation
+# - **Version:** Python/3.10.15
+
+## Script Overview
+
+# Script to generate synthetic data with the layout of the real GP2 inputs so the pipeline can be benchmarked offline:
+# - <out>/snp_metrics/<barcode>/snp_metrics_<barcode>/Sample_ID=<iid>/part-0.parquet per-sample SNP metrics
+# - <out>/master_key_full.txt and <out>/master_key_release.csv master keys
+# - <out>/genotypes.pvar release pvar
+# - <out>/data/annotated_pathogenic_vars.txt annotated pathogenic variants
+# all values are random, only shapes, column names and types follow the real files
+
+## CHANGELOG
+
+# 18-OCT-2026: Script started
+
+
+# ancestry labels and their share of samples (roughly GP2-like, a few ancestries below the 50 sample cutoff at small scale)
+ANCESTRIES = {
+    'EUR': 0.45, 'AJ': 0.08, 'AFR': 0.07, 'AAC': 0.06, 'EAS': 0.08, 'SAS': 0.05,
+    'AMR': 0.06, 'CAH': 0.04, 'MDE': 0.05, 'FIN': 0.03, 'CAS': 0.03
+}
+
+# chromosomes with target variants and the rough location of their PD genes (GBA, PINK1, PARK7, LRRK2, VPS13C, ...)
+TARGET_REGIONS = {
+    '1': [155235000, 16986000, 20633000, 7962000], '2': [74530000], '3': [132477000], '4': [89822000],
+    '6': [161350000], '12': [40225000], '15': [89316000, 61856000], '16': [46660000], '21': [32639000], '22': [38112000, 32479000]
+}
+
+BASES = np.array(['A', 'C', 'G', 'T'])
+
+# Theta centre of each genotype cluster
+THETA_CENTRES = {'AA': 0.05, 'AB': 0.5, 'BB': 0.95}
+
+
+def make_variants(n_variants, n_targets, rng):
+    # target variants are spread over the PD gene regions, the rest over the genome
+    target_chroms = rng.choice(list(TARGET_REGIONS.keys()), n_targets)
+    target_pos = np.array([rng.choice(TARGET_REGIONS[chrom]) for chrom in target_chroms]) + rng.integers(0, 20000, n_targets)
+
+    background_chroms = rng.integers(1, 23, n_variants - n_targets).astype(str)
+    background_pos = rng.integers(1000000, 200000000, n_variants - n_targets)
+
+    variants = pd.DataFrame({
+        'chrom': np.concatenate([target_chroms, background_chroms]),
+        'pos': np.concatenate([target_pos, background_pos]),
+        'target': np.concatenate([np.ones(n_targets, dtype=bool), np.zeros(n_variants - n_targets, dtype=bool)])
+    })
+    variants = variants.drop_duplicates(subset=['chrom', 'pos']).reset_index(drop=True)
+
+    ref = rng.integers(0, 4, len(variants))
+    variants['ref'] = BASES[ref]
+    variants['alt'] = BASES[(ref + rng.integers(1, 4, len(variants))) % 4]
+    variants['snpID'] = 'chr' + variants['chrom'] + ':' + variants['pos'].astype(str) + ':' + variants['ref'] + ':' + variants['alt']
+
+    # real snp metrics files are sorted by chromosome and position
+    variants['chrom_order'] = variants['chrom'].astype(int)
+    variants = variants.sort_values(['chrom_order', 'pos']).drop(columns=['chrom_order']).reset_index(drop=True)
+
+    # B allele frequency: targets are rare pathogenic variants, background variants common
+    variants['freq'] = np.where(variants['target'], rng.uniform(0.0005, 0.02, len(variants)), rng.uniform(0.01, 0.5, len(variants)))
+    variants['gentrain'] = rng.uniform(0.4, 0.95, len(variants))
+
+    return variants
+
+
+def make_samples(n_samples, samples_per_barcode, rng):
+    ancestry = rng.choice(list(ANCESTRIES.keys()), n_samples, p=np.array(list(ANCESTRIES.values())) / sum(ANCESTRIES.values()))
+    barcode = (205000000000 + np.arange(n_samples) // samples_per_barcode).astype(str)
+    position = np.arange(n_samples) % samples_per_barcode
+
+    samples = pd.DataFrame({
+        'GP2sampleID': [f'SYN_{i:06d}_s1' for i in range(n_samples)],
+        'IID': [f'{b}_R{p // 2 + 1:02d}C{p % 2 + 1:02d}' for b, p in zip(barcode, position)],
+        'SentrixBarcode_A': barcode,
+        'gp2_phenotype': rng.choice(['PD', 'Control', 'Other'], n_samples, p=[0.45, 0.45, 0.10]),
+        'label': ancestry,
+        'pruned': (rng.random(n_samples) < 0.03).astype(int)
+    })
+
+    return samples
+
+
+def write_sample_metrics(sample, variants, out_dir, row_group_size, rng):
+    n = len(variants)
+
+    # genotypes from allele frequencies, with ~1% no calls
+    b_alleles = (rng.random((n, 2)) < variants['freq'].values[:, None]).sum(axis=1)
+    gt = np.array(['AA', 'AB', 'BB'])[b_alleles]
+    gt = np.where(rng.random(n) < 0.01, 'NC', gt)
+
+    theta = pd.Series(gt).map(THETA_CENTRES).fillna(0.5).values + rng.normal(0, 0.03, n)
+    theta = np.where(gt == 'NC', rng.uniform(0, 1, n), theta)
+    r = rng.normal(1.2, 0.15, n)
+
+    metrics = pa.table({
+        'snpID': variants['snpID'].values,
+        'chromosome': variants['chrom'].values,
+        'position': variants['pos'].values,
+        'R': r,
+        'Theta': theta,
+        'GenTrain_Score': variants['gentrain'].values,
+        'GT': gt,
+        'ALLELE_A': variants['ref'].values,
+        'ALLELE_B': variants['alt'].values,
+        'BAlleleFreq': np.clip(theta, 0, 1),
+        'LogRRatio': np.log2(r / 1.2),
+        'a1': variants['alt'].values,
+        'a2': variants['ref'].values
+    })
+
+    sample_dir = f'{out_dir}/snp_metrics/{sample["SentrixBarcode_A"]}/snp_metrics_{sample["SentrixBarcode_A"]}/Sample_ID={sample["IID"]}'
+    os.makedirs(sample_dir, exist_ok=True)
+    pq.write_table(metrics, f'{sample_dir}/part-0.parquet', row_group_size=row_group_size)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Synthetic GP2 Data Generator')
+    parser.add_argument('--out', type=str, required=True, help='Output directory')
+    parser.add_argument('--samples', type=int, default=1000, help='Number of samples in the master keys')
+    parser.add_argument('--samples-per-barcode', type=int, default=24, help='Samples per Sentrix barcode')
+    parser.add_argument('--variants', type=int, default=20000, help='Variants per sample (including targets)')
+    parser.add_argument('--targets', type=int, default=400, help='Number of annotated pathogenic target variants')
+    parser.add_argument('--row-group-size', type=int, default=2000, help='Rows per parquet row group')
+    parser.add_argument('--missing-fraction', type=float, default=0.02, help='Fraction of master key samples without a metrics partition')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    os.makedirs(f'{args.out}/data', exist_ok=True)
+
+    variants = make_variants(args.variants, args.targets, rng)
+    samples = make_samples(args.samples, args.samples_per_barcode, rng)
+
+    # master keys: the full key names samples by filename, the release key carries phenotype/ancestry/pruning
+    samples[['GP2sampleID', 'IID', 'SentrixBarcode_A']].rename({'IID':'filename'}, axis=1).to_csv(f'{args.out}/master_key_full.txt', sep='\t', index=False)
+    samples[['GP2sampleID', 'gp2_phenotype', 'label', 'pruned']].to_csv(f'{args.out}/master_key_release.csv', index=False)
+
+    # release pvar
+    pvar = variants[['chrom', 'pos', 'snpID', 'ref', 'alt']]
+    pvar.columns = ['#CHROM', 'POS', 'ID', 'REF', 'ALT']
+    pvar.to_csv(f'{args.out}/genotypes.pvar', sep='\t', index=False)
+
+    # annotated pathogenic variants in the ANNOVAR layout of 00_pathogenic_variants_analyses.ipynb
+    targets = variants[variants['target']]
+    pd.DataFrame({
+        'Chr': 'chr' + targets['chrom'],
+        'Start': targets['pos'],
+        'End': targets['pos'],
+        'Ref': targets['ref'],
+        'Alt': targets['alt'],
+        'Gene.refGene': 'SYN',
+        'avsnp151': '.',
+        'CLNALLELEID': '.',
+        'CLNDN': 'Parkinson_disease',
+        'CLNDISDB': '.',
+        'CLNREVSTAT': '.',
+        'CLNSIG': 'Pathogenic'
+    }).to_csv(f'{args.out}/data/annotated_pathogenic_vars.txt', sep='\t', index=False)
+
+    # per-sample parquet partitions, leaving some samples out like samples without processed metrics
+    written = 0
+    for sample in samples.to_dict('records'):
+        if rng.random() < args.missing_fraction:
+            continue
+        write_sample_metrics(sample, variants, args.out, args.row_group_size, rng)
+        written += 1
+
+    print(f'Samples: {len(samples)} ({written} with metrics)', file=sys.stderr)
+    print(f'Variants: {len(variants)} ({variants["target"].sum()} targets)', file=sys.stderr)
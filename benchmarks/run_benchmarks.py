@@ -0,0 +1,174 @@
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import subprocess
+
+# GP2 Pathogenic Variant Analysis
+
+# - **Project:** Parkinson’s Disease Pathogenic Variants: Cross-Ancestry Analysis and Microarray Data Validation
+# - **Version:** Python/3.10.15
+
+## Script Overview
+
+# Script to benchmark the pipeline on data from make_synthetic_gp2_data.py (Linux only, reads /proc)
+# - each stage runs as its own process and is measured for wall time, peak RSS and bytes read (over all its processes)
+# - results are printed as a table and written as one JSON line per stage
+
+## CHANGELOG
+
+# 18-OCT-2026: Script started
+
+
+ANALYSES_DIR = os.path.abspath(f'{os.path.dirname(os.path.abspath(__file__))}/../analyses')
+
+# viewer start: open the variant store and load the first variant, like the app does on its first selection
+VIEWER_LOAD = f'''
+import sys
+sys.path.insert(0, {ANALYSES_DIR!r})
+from pathogenic_variants_io import open_variant_store, read_variant
+variant_store = open_variant_store('data/pathogenic_variants_store')
+snp_df = read_variant(variant_store, variant_store['index'].index[0])
+print(snp_df.shape, file=sys.stderr)
+'''
+
+
+def stage_commands(data_dir, workers):
+    return {
+        'extract': [sys.executable, f'{ANALYSES_DIR}/02_extract_pathogenic_variants_snp_metrics.py',
+                    '--chr', 'all', '--restart', '--workers', str(workers),
+                    '--snp-metrics-dir', f'{data_dir}/snp_metrics',
+                    '--master-key-full', f'{data_dir}/master_key_full.txt',
+                    '--master-key-release', f'{data_dir}/master_key_release.csv',
+                    '--genotypes', f'{data_dir}/genotypes',
+                    '--pathogenic-snps', f'{data_dir}/data/annotated_pathogenic_vars.txt',
+                    '--out', f'{data_dir}/data'],
+        'extract_full_reader': [sys.executable, f'{ANALYSES_DIR}/02_extract_pathogenic_variants_snp_metrics.py',
+                                '--chr', 'all', '--reader', 'full', '--output', 'csv', '--workers', str(workers),
+                                '--snp-metrics-dir', f'{data_dir}/snp_metrics',
+                                '--master-key-full', f'{data_dir}/master_key_full.txt',
+                                '--master-key-release', f'{data_dir}/master_key_release.csv',
+                                '--genotypes', f'{data_dir}/genotypes',
+                                '--pathogenic-snps', f'{data_dir}/data/annotated_pathogenic_vars.txt',
+                                '--out', f'{data_dir}/csv_metrics'],
+        'build_store': [sys.executable, f'{ANALYSES_DIR}/05_build_pathogenic_variants_store.py'],
+        'viewer_load': [sys.executable, '-c', VIEWER_LOAD],
+        'render': [sys.executable, f'{ANALYSES_DIR}/06_render_pathogenic_variants_cluster_plots.py',
+                   '--plots-dir', f'{data_dir}/plots', '--force', '--workers', str(workers)],
+        'metrics': [sys.executable, f'{ANALYSES_DIR}/04_pathogenic_variants_cluster_plot_metrics.py', '--automated']
+    }
+
+
+# pid and every descendant of it
+def process_tree(pid):
+    pids = [pid]
+    for child_pid in pids:
+        try:
+            for task in os.listdir(f'/proc/{child_pid}/task'):
+                with open(f'/proc/{child_pid}/task/{task}/children') as f:
+                    pids.extend(int(child) for child in f.read().split())
+        except (FileNotFoundError, ProcessLookupError):
+            pass
+    return pids
+
+
+# bytes read through read() calls (rchar, includes page cache hits) and from storage (read_bytes), and current RSS
+def read_proc(pid):
+    stats = {}
+    try:
+        with open(f'/proc/{pid}/io') as f:
+            for line in f:
+                key, value = line.split(':')
+                stats[key] = int(value)
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    stats['rss'] = int(line.split()[1]) * 1024
+    except (FileNotFoundError, PermissionError, ProcessLookupError):
+        pass
+    return stats
+
+
+# run one stage, polling /proc for its processes' counters until it exits
+## Note: peak_rss is the largest single process (wait4), peak_tree_rss the largest sum over all the stage's processes
+## seen while polling; reads after the last poll of a process are missed
+## Note: a stage still running after timeout seconds is killed with all its processes and reported as 'timeout'
+def run_stage(name, command, cwd, timeout=None, poll_seconds=0.05):
+    start = time.time()
+    process = subprocess.Popen(command, cwd=cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    os.set_blocking(process.stderr.fileno(), False)
+
+    last_stats = {}
+    peak_tree_rss = 0
+    stderr_chunks = []
+    timed_out = False
+    while True:
+        pid, status, rusage = os.wait4(process.pid, os.WNOHANG)
+
+        tree_rss = 0
+        for tree_pid in process_tree(process.pid) if pid == 0 else []:
+            stats = read_proc(tree_pid)
+            if stats:
+                last_stats[tree_pid] = stats
+                tree_rss += stats.get('rss', 0)
+        peak_tree_rss = max(peak_tree_rss, tree_rss)
+
+        chunk = process.stderr.read()
+        if chunk:
+            stderr_chunks.append(chunk)
+
+        if pid != 0:
+            break
+        if timeout is not None and not timed_out and time.time() - start > timeout:
+            timed_out = True
+            for tree_pid in reversed(process_tree(process.pid)):
+                try:
+                    os.kill(tree_pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+        time.sleep(poll_seconds)
+
+    wall = time.time() - start
+    returncode = os.waitstatus_to_exitcode(status)
+    process.returncode = returncode
+    stderr = b''.join(stderr_chunks).decode('utf-8', errors='replace')
+
+    return {
+        'stage': name,
+        'status': 'timeout' if timed_out else 'ok' if returncode == 0 else 'failed',
+        'wall_seconds': round(wall, 3),
+        'peak_rss_bytes': rusage.ru_maxrss * 1024,
+        'peak_tree_rss_bytes': peak_tree_rss,
+        'rchar_bytes': sum(stats.get('rchar', 0) for stats in last_stats.values()),
+        'read_bytes': sum(stats.get('read_bytes', 0) for stats in last_stats.values()),
+        'stderr_tail': stderr.strip().split('\n')[-3:]
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Pipeline Benchmarks')
+    parser.add_argument('--data', type=str, required=True, help='Directory written by make_synthetic_gp2_data.py')
+    parser.add_argument('--stages', type=str, nargs='+', default=['extract', 'build_store', 'viewer_load', 'render', 'metrics'], help='Stages to run, in order')
+    parser.add_argument('--workers', type=int, default=1, help='Workers passed to the extractor and renderer')
+    parser.add_argument('--timeout', type=float, default=None, help='Kill a stage after this many seconds')
+    parser.add_argument('--json', type=str, default=None, help='Append one JSON line per stage to this file')
+    args = parser.parse_args()
+
+    data_dir = os.path.abspath(args.data)
+    commands = stage_commands(data_dir, args.workers)
+
+    results = []
+    for stage in args.stages:
+        result = run_stage(stage, commands[stage], cwd=data_dir, timeout=args.timeout)
+        result['workers'] = args.workers
+        results.append(result)
+        print(f'{stage:<20} {result["status"]:<7} {result["wall_seconds"]:>9.2f} s {result["peak_rss_bytes"] / 2**20:>9.1f} MiB {result["peak_tree_rss_bytes"] / 2**20:>9.1f} MiB all {result["rchar_bytes"] / 2**20:>10.1f} MiB read', file=sys.stderr)
+        if result['status'] != 'ok':
+            print('\n'.join(result['stderr_tail']), file=sys.stderr)
+
+    if args.json:
+        with open(args.json, 'a') as f:
+            for result in results:
+                f.write(json.dumps(result) + '\n')